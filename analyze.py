@@ -0,0 +1,216 @@
+"""
+Bulk analysis of recorded replays. Replay files are found, memory-mapped and
+played through the rules engine one at a time on a process pool, so only the
+games being analysed are ever in memory.
+
+Example: python analyze.py replays --games games.csv --summary summary.json
+"""
+import argparse
+import csv
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+import constants as c
+from deals import deal_permutation
+from engine import Engine
+from journal import Journal
+from policies import is_stock_move, useful_moves
+from replay import REDO, UNDO, apply_event, iter_events, read_header
+
+GAME_FIELDS = [
+    'file', 'deal', 'won', 'moves', 'undos', 'stock_recycles',
+    'first_top_move', 'dead_end', 'error',
+]
+
+
+def find_replays(directory):
+    """
+    :param directory: The directory to search, including subdirectories
+    :return: A generator of replay file paths
+    """
+    for entry in os.scandir(directory):
+        if entry.is_dir():
+            yield from find_replays(entry.path)
+        elif entry.name.endswith('.klr'):
+            yield entry.path
+
+
+def is_dead_end(engine):
+    """
+    A lost position: the game is not won, no move other than drawing from or
+    recycling the stock can make progress, and no card in the stock or the
+    bottom face up pile could be played even if it were drawn.
+    :param engine: The game Engine
+    :return: True if the position is a dead end
+    """
+    if engine.is_won():
+        return False
+
+    if any(not is_stock_move(move) for move in useful_moves(engine)):
+        return False
+
+    for pile_index in (c.BOTTOM_FACE_DOWN_PILE, c.BOTTOM_FACE_UP_PILE):
+        for card in engine.piles[pile_index]:
+            for target in range(c.MIDDLE_PILE_1, c.MIDDLE_PILE_7 + 1):
+                if engine.can_play_to_middle(card, target):
+                    return False
+            for target in range(c.TOP_PILE_1, c.TOP_PILE_4 + 1):
+                if engine.can_play_to_top(card, 1, target):
+                    return False
+
+    return True
+
+
+def analyze_replay(data):
+    """
+    Play a replay through the rules engine and collect its statistics.
+    :param data: The contents of a replay file (any bytes-like object)
+    :return: A dict with the GAME_FIELDS other than file and error
+    """
+    deal_number, offset = read_header(data)
+    engine = Engine()
+    engine.deal(deal_permutation(deal_number))
+    journal = Journal()
+
+    moves = 0
+    undos = 0
+    stock_recycles = 0
+    first_top_move = None
+
+    for event in iter_events(data, offset):
+        if event == UNDO:
+            undos += 1
+        elif event != REDO:
+            moves += 1
+            if event.source == c.BOTTOM_FACE_UP_PILE and event.target == c.BOTTOM_FACE_DOWN_PILE:
+                stock_recycles += 1
+            if event.target >= c.TOP_PILE_1 and first_top_move is None:
+                first_top_move = moves
+
+        apply_event(engine, journal, event)
+
+    return {
+        'deal': deal_number,
+        'won': engine.is_won(),
+        'moves': moves,
+        'undos': undos,
+        'stock_recycles': stock_recycles,
+        'first_top_move': first_top_move,
+        'dead_end': is_dead_end(engine),
+    }
+
+
+def analyze_file(path):
+    """
+    Memory-map a replay file and analyse it.
+    :param path: The replay file
+    :return: A dict with the GAME_FIELDS; error holds the reason a file could
+    not be read, and the other statistics are None
+    """
+    result = dict.fromkeys(GAME_FIELDS)
+    result['file'] = path
+
+    try:
+        with open(path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            result.update(analyze_replay(data))
+    except (OSError, ValueError) as error:
+        result['error'] = str(error)
+
+    return result
+
+
+class Summary:
+    """
+    Running totals over analysed games.
+    """
+    def __init__(self):
+        self.games = 0
+        self.errors = 0
+        self.wins = 0
+        self.dead_ends = 0
+        self.moves = 0
+        self.undos = 0
+        self.stock_recycles = 0
+        self.games_with_top_move = 0
+        self.first_top_move_total = 0
+
+    def add(self, result):
+        """
+        :param result: A dict returned by analyze_file
+        """
+        if result['error'] is not None:
+            self.errors += 1
+            return
+
+        self.games += 1
+        self.wins += result['won']
+        self.dead_ends += result['dead_end']
+        self.moves += result['moves']
+        self.undos += result['undos']
+        self.stock_recycles += result['stock_recycles']
+
+        if result['first_top_move'] is not None:
+            self.games_with_top_move += 1
+            self.first_top_move_total += result['first_top_move']
+
+    def as_dict(self):
+        games = max(self.games, 1)
+        return {
+            'games': self.games,
+            'unreadable_files': self.errors,
+            'wins': self.wins,
+            'win_rate': self.wins / games,
+            'dead_ends': self.dead_ends,
+            'mean_moves': self.moves / games,
+            'mean_undos': self.undos / games,
+            'mean_stock_recycles': self.stock_recycles / games,
+            'mean_first_top_move': self.first_top_move_total / max(self.games_with_top_move, 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise a directory of replay files.')
+    parser.add_argument('directory', help='directory of .klr replay files')
+    parser.add_argument('--games', metavar='FILE', default=None,
+                        help='CSV file for per-game statistics')
+    parser.add_argument('--summary', metavar='FILE', default=None,
+                        help='JSON file for the summary (default: stdout)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--chunksize', type=int, default=32,
+                        help='files handed to a worker at a time')
+    args = parser.parse_args()
+
+    summary = Summary()
+    games_file = open(args.games, 'w', newline='') if args.games else None
+    games_writer = csv.DictWriter(games_file, fieldnames=GAME_FIELDS) if games_file else None
+    if games_writer:
+        games_writer.writeheader()
+
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.imap_unordered(
+            analyze_file,
+            find_replays(args.directory),
+            chunksize=args.chunksize
+        )
+        for result in results:
+            summary.add(result)
+            if games_writer:
+                games_writer.writerow(result)
+
+    if games_file:
+        games_file.close()
+
+    if args.summary:
+        with open(args.summary, 'w') as file:
+            json.dump(summary.as_dict(), file, indent=2)
+    else:
+        json.dump(summary.as_dict(), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
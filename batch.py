@@ -0,0 +1,246 @@
+"""
+Vectorized heuristic features for large batches of game states, for training
+and evaluating auto-play policies. Requires NumPy.
+
+A state is encoded as CARD_COUNT int16 codes indexed by card id. Each code
+holds the index of the pile the card is in (bits 0 to 3), whether it is face
+up (bit 4), whether it is the top card of its pile (bit 5) and its position
+from the bottom of the pile (bits 8 to 13). A batch is an (N, CARD_COUNT)
+array of encoded states, which evaluate turns into features with a fixed
+number of whole-array operations, whatever N is.
+
+The Klondike rules are written out again here on whole (suit, rank) slices of
+the cards rather than taken from the Engine: a card goes on a card of the
+other color (see OTHER_COLOR_SUITS, from CARD_COLORS) one rank higher in the
+middle piles, never as an Ace, and on the card of its suit one rank lower in
+the top piles; Kings go to empty middle piles and Aces to empty top piles. The
+move counts are meant to agree with Engine.legal_moves; benchmarks.state_features
+computes the same features one state at a time from the Engine, and is the
+reference to compare against when these rules change. Only single deck
+Klondike states reachable in play are supported: face down cards are always
+below the face up cards of their pile.
+"""
+from typing import NamedTuple
+import numpy as np
+import constants as c
+
+PILE_MASK = 0x0F
+FACE_UP_SHIFT = 4
+TOP_SHIFT = 5
+POSITION_SHIFT = 8
+
+SUIT_COUNT = len(c.CARD_SUITS)
+RANK_COUNT = len(c.CARD_VALUES)
+COLUMN_COUNT = c.MIDDLE_ROW_LEN
+KINGS = np.arange(c.KING_RANK, c.CARD_COUNT, RANK_COUNT)
+ACES = np.arange(c.ACE_RANK, c.CARD_COUNT, RANK_COUNT)
+
+# The suits of the other color, on which each suit is stacked in the middle
+# piles
+OTHER_COLOR_SUITS = [
+    [other for other in range(SUIT_COUNT)
+     if c.CARD_COLORS[other * RANK_COUNT] != c.CARD_COLORS[suit * RANK_COUNT]]
+    for suit in range(SUIT_COUNT)
+]
+
+# Per pile sums are added up for every card at once by giving each pile a bit
+# field of a 64 bit word. Pile lengths take LENGTH_BITS (the last top pile
+# gets the 4 bits left, enough for its 13 cards); the other counts take
+# FIELD_BITS, enough for the at most 7 moves from a pile. The face down card
+# counts of the middle piles are kept above the move counts of the 8 piles
+# that cards can be moved from
+LENGTH_BITS = 5
+LENGTH_MASK = (1 << LENGTH_BITS) - 1
+FIELD_BITS = 4
+FIELD_MASK = (1 << FIELD_BITS) - 1
+FACE_DOWN_FIELDS = 8 * FIELD_BITS
+
+PILE_FIELDS = np.arange(c.PILE_COUNT, dtype=np.uint64)[:, None]
+
+
+class Features(NamedTuple):
+    """
+    The heuristic features of a batch of N states.
+    face_down: (N, 7) the number of face down cards in each middle pile
+    foundation: (N, 4) the number of cards in each top pile
+    moves: (N, PILE_COUNT) the number of legal moves taking cards from each
+    pile, as listed by Engine.legal_moves (drawing from the stock counts for
+    the bottom face down pile, recycling for the bottom face up pile)
+    blocked_kings: (N,) the number of Kings in the middle piles that are not
+    at the bottom of their pile, and so cover face down cards
+    """
+    face_down: np.ndarray
+    foundation: np.ndarray
+    moves: np.ndarray
+    blocked_kings: np.ndarray
+
+
+def encode(piles, face_up):
+    """
+    Encode one state.
+    :param piles: PILE_COUNT lists of card ids, ordered bottom to top
+    :param face_up: Indexed by card id, true if the card is face up
+    :return: An int16 array of CARD_COUNT codes
+    """
+    state = np.empty(c.CARD_COUNT, dtype=np.int16)
+
+    for pile_index, pile in enumerate(piles):
+        for position, card in enumerate(pile):
+            state[card] = pile_index | position << POSITION_SHIFT \
+                | bool(face_up[card]) << FACE_UP_SHIFT \
+                | (position == len(pile) - 1) << TOP_SHIFT
+
+    return state
+
+
+def encode_card_piles(card_piles):
+    """
+    Encode the state shown by a Game.
+    :param card_piles: The Game's card_piles: PILE_COUNT lists of Cards
+    :return: An int16 array of CARD_COUNT codes
+    """
+    face_up = [False] * c.CARD_COUNT
+    for pile in card_piles:
+        for card in pile:
+            face_up[card.card_id] = card.is_face_up
+
+    return encode([[card.card_id for card in pile] for pile in card_piles], face_up)
+
+
+def encode_engine(engine):
+    """
+    Encode an engine's state.
+    :param engine: The game Engine
+    :return: An int16 array of CARD_COUNT codes
+    """
+    return encode(engine.piles, engine.face_up)
+
+
+def evaluate(states, chunk_size=c.BATCH_CHUNK_SIZE):
+    """
+    Compute the features of a batch of states. The batch is processed
+    chunk_size states at a time so that the intermediate arrays stay in cache.
+    :param states: An (N, CARD_COUNT) array of encoded states
+    :param chunk_size: The number of states per chunk
+    :return: The Features of every state
+    """
+    states = np.asarray(states, dtype=np.int16)
+    count = len(states)
+
+    features = Features(
+        np.empty((count, COLUMN_COUNT), dtype=np.int16),
+        np.empty((count, c.TOP_ROW_LEN), dtype=np.int16),
+        np.empty((count, c.PILE_COUNT), dtype=np.int16),
+        np.empty(count, dtype=np.int16),
+    )
+
+    for start in range(0, count, chunk_size):
+        evaluate_chunk(states[start:start + chunk_size], features, start)
+
+    return features
+
+
+def evaluate_chunk(states, features, start):
+    """
+    Compute the features of part of a batch. The cards are laid out along the
+    first axis, so that every operation runs along contiguous rows of states
+    and sums over the cards are additions of whole rows.
+    :param states: An (n, CARD_COUNT) array of encoded states
+    :param features: The batch's Features, whose rows from start are filled in
+    :param start: The index of the first state in the batch
+    """
+    n = len(states)
+    end = start + n
+    one = np.uint8(1)
+    columns = slice(c.MIDDLE_PILE_1, c.MIDDLE_PILE_7 + 1)
+    foundations = slice(c.TOP_PILE_1, c.TOP_PILE_4 + 1)
+    sources = slice(c.BOTTOM_FACE_UP_PILE, c.MIDDLE_PILE_7 + 1)
+
+    codes = np.ascontiguousarray(states.T)
+    low = codes.astype(np.uint8)
+    pile = low & np.uint8(PILE_MASK)
+    face_up_bits = (low >> np.uint8(FACE_UP_SHIFT)) & one
+    top_bits = (low >> np.uint8(TOP_SHIFT)) & one
+    face_up = face_up_bits.view(bool)
+    in_column = pile - np.uint8(c.MIDDLE_PILE_1) < np.uint8(COLUMN_COUNT)
+    in_foundation = pile - np.uint8(c.TOP_PILE_1) < np.uint8(c.TOP_ROW_LEN)
+
+    # Count the pile tops each card can be played on: in the middle piles, the
+    # cards of the other color one rank higher, except for Aces; in the top
+    # piles, the card of the same suit one rank lower, for top cards only.
+    # Kings and Aces going to empty piles are counted separately
+    column_tops = (in_column * top_bits).reshape(SUIT_COUNT, RANK_COUNT, n)
+    foundation_tops = (in_foundation * top_bits).reshape(SUIT_COUNT, RANK_COUNT, n)
+    targets = np.zeros((SUIT_COUNT, RANK_COUNT, n), dtype=np.uint8)
+
+    for suit, other_suits in enumerate(OTHER_COLOR_SUITS):
+        targets[suit, c.ACE_RANK + 1:c.KING_RANK] = \
+            column_tops[other_suits, c.ACE_RANK + 2:].sum(axis=0, dtype=np.uint8)
+
+    targets[:, c.ACE_RANK + 1:] += foundation_tops[:, :c.KING_RANK] \
+        * top_bits.reshape(SUIT_COUNT, RANK_COUNT, n)[:, c.ACE_RANK + 1:]
+
+    # Face up middle pile cards and the top card of the bottom face up pile can
+    # be picked up
+    waste_top = (pile == np.uint8(c.BOTTOM_FACE_UP_PILE)) & top_bits.view(bool)
+    movable = face_up & (in_column | waste_top)
+    card_moves = targets.reshape(c.CARD_COUNT, n) * movable
+
+    # Sum the pile lengths, and the moves of the face up cards and the face
+    # down middle pile cards of each pile
+    shifts = (pile << np.uint8(2)) + np.uint8(FACE_DOWN_FIELDS - 2 * FIELD_BITS) \
+        - face_up_bits * np.uint8(FACE_DOWN_FIELDS - FIELD_BITS)
+    lengths = np.add.reduce(
+        np.left_shift(np.uint64(1), pile.astype(np.uint64) * np.uint64(LENGTH_BITS)),
+        axis=0
+    )
+    counted = card_moves | (in_column & ~face_up)
+    counts = np.add.reduce(
+        np.left_shift(counted.astype(np.uint64), shifts.astype(np.uint64)),
+        axis=0
+    )
+
+    # Sum the movable Kings (in the low 2 bits of each field) and top Aces
+    king_fields = pile[KINGS].astype(np.uint64) * np.uint64(FIELD_BITS)
+    ace_fields = pile[ACES].astype(np.uint64) * np.uint64(FIELD_BITS) + np.uint64(2)
+    kings_and_aces = np.add.reduce(
+        np.left_shift(movable[KINGS].astype(np.uint64), king_fields),
+        axis=0
+    ) + np.add.reduce(
+        np.left_shift((movable[ACES] & top_bits[ACES].view(bool)).astype(np.uint64),
+                      ace_fields),
+        axis=0
+    )
+
+    lengths = ((lengths >> PILE_FIELDS * np.uint64(LENGTH_BITS))
+               & np.uint64(LENGTH_MASK)).astype(np.int16)
+    card_moves = ((counts >> PILE_FIELDS[:sources.stop - 1] * np.uint64(FIELD_BITS))
+                  & np.uint64(FIELD_MASK)).astype(np.int16)
+    face_down = ((counts >> PILE_FIELDS[:COLUMN_COUNT] * np.uint64(FIELD_BITS)
+                  + np.uint64(FACE_DOWN_FIELDS))
+                 & np.uint64(FIELD_MASK)).astype(np.int16)
+    kings_and_aces = (kings_and_aces >> PILE_FIELDS[sources] * np.uint64(FIELD_BITS)) \
+        .astype(np.int16)
+
+    empty = lengths == 0
+    empty_columns = empty[columns].sum(axis=0, dtype=np.int16)
+    empty_foundations = empty[foundations].sum(axis=0, dtype=np.int16)
+
+    moves = np.zeros((c.PILE_COUNT, n), dtype=np.int16)
+    moves[sources] = card_moves + (kings_and_aces & 3) * empty_columns \
+        + (kings_and_aces >> 2 & 3) * empty_foundations
+
+    # A middle pile of only face down cards has its top card turned over
+    moves[columns] += (face_down == lengths[columns]) & (face_down > 0)
+
+    # Draw from the stock, or recycle the bottom face up pile once it is empty
+    stock = lengths[c.BOTTOM_FACE_DOWN_PILE] > 0
+    moves[c.BOTTOM_FACE_DOWN_PILE] = stock
+    moves[c.BOTTOM_FACE_UP_PILE] += ~stock & (lengths[c.BOTTOM_FACE_UP_PILE] > 0)
+
+    features.face_down[start:end] = face_down.T
+    features.foundation[start:end] = lengths[foundations].T
+    features.moves[start:end] = moves.T
+    features.blocked_kings[start:end] = (
+        in_column[KINGS] & (codes[KINGS] >> POSITION_SHIFT > 0)
+    ).sum(axis=0)
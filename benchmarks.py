@@ -0,0 +1,564 @@
+"""
+Benchmark suite for the game's hot paths. The game benchmarks drive the real
+Game window methods through a scripted, seeded workload: every step picks the
+greedy policy's move and performs it with mouse presses, motions and releases.
+
+Run with: python benchmarks.py --headless --output results.json
+Compare with a saved baseline: python benchmarks.py --headless --baseline
+baseline.json (add --save-baseline to record one). The run fails when the
+mean latency of any benchmark exceeds the baseline by more than --threshold.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+if __name__ == '__main__' and '--headless' in sys.argv:
+    os.environ['ARCADE_HEADLESS'] = '1'
+
+import arcade
+import numpy as np
+import batch
+import constants as c
+from card import Card
+from deals import deal_permutation
+from engine import Engine
+from layout import DropTable
+from movegen import MoveGenerator
+from policies import GreedyPolicy, is_stock_move, useful_moves
+from variants import KLONDIKE, SPIDER
+
+BENCHMARK_DEAL = 1
+BENCHMARK_STEPS = 400
+
+
+class Bench:
+    """
+    Collects the latency of each call of each named benchmark. When
+    trace_memory is True, calls are run under tracemalloc and the memory each
+    call allocates at its peak is collected instead.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.latencies = {}
+        self.allocations = {}
+        self.batches = {}
+
+    def call(self, name, function, *args):
+        """
+        Call a function and record its latency or allocations.
+        :param name: The benchmark name
+        :param function: The function to call
+        :param args: The function's arguments
+        :return: The function's return value
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            result = function(*args)
+            self.allocations.setdefault(name, []).append(tracemalloc.get_traced_memory()[1] - base)
+            return result
+
+        start = time.perf_counter()
+        result = function(*args)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    def batch(self, name, seconds, number):
+        """
+        Record a benchmark timed as a whole, for calls too short to time one by
+        one.
+        :param name: The benchmark name
+        :param seconds: The total time taken
+        :param number: The number of calls timed
+        """
+        if not self.trace_memory:
+            self.batches[name] = (seconds, number)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def summarize(timing, memory):
+    """
+    Combine a timing run and a memory run into one result per benchmark.
+    :param timing: The Bench of the timing run
+    :param memory: The Bench of the tracemalloc run
+    :return: A dict of benchmark name to calls, ops_per_sec, mean_us, p50_us,
+    p95_us and alloc_kib_per_call
+    """
+    results = {}
+
+    for name, latencies in timing.latencies.items():
+        allocations = memory.allocations.get(name)
+        total = sum(latencies)
+        results[name] = {
+            'calls': len(latencies),
+            'ops_per_sec': len(latencies) / total if total else None,
+            'mean_us': total / len(latencies) * 1e6,
+            'p50_us': percentile(latencies, 50) * 1e6,
+            'p95_us': percentile(latencies, 95) * 1e6,
+            'alloc_kib_per_call': sum(allocations) / len(allocations) / 1024 if allocations else None,
+        }
+
+    for name, (seconds, number) in timing.batches.items():
+        results[name] = {
+            'calls': number,
+            'ops_per_sec': number / seconds,
+            'mean_us': seconds / number * 1e6,
+            'p50_us': None,
+            'p95_us': None,
+            'alloc_kib_per_call': None,
+        }
+
+    return results
+
+
+def legacy_drop(primary_held_card, card_mats, card_deck):
+    """
+    The drop resolution used before DropTable: the closest mat, and the
+    closest card out of a new SpriteList of every other card.
+    """
+    closest_card_pile, distance = arcade.get_closest_sprite(primary_held_card, card_mats)
+
+    other_card_sprites = arcade.SpriteList()
+    for card in card_deck:
+        if card != primary_held_card:
+            other_card_sprites.append(card)
+
+    closest_card_sprite, sprite_distance = arcade.get_closest_sprite(
+        primary_held_card,
+        other_card_sprites
+    )
+
+    if arcade.check_for_collision(primary_held_card, closest_card_pile) \
+            or arcade.check_for_collision(primary_held_card, closest_card_sprite):
+        return card_mats.index(closest_card_pile)
+
+    return None
+
+
+def legacy_can_stack(card_suit, card_value, top_suit, top_value):
+    """
+    The middle pile check used before the lookup tables: validate_color and
+    check_card_order on the suit and value strings.
+    """
+    red_on_black = card_suit in c.RED_SUITS and top_suit in c.BLACK_SUITS
+    black_on_red = card_suit in c.BLACK_SUITS and top_suit in c.RED_SUITS
+    order = c.CARD_VALUES.index(top_value) - c.CARD_VALUES.index(card_value)
+    return card_value != 'A' and (red_on_black or black_on_red) and order == 1
+
+
+def bench_validation(bench, number=200_000):
+    """
+    Compare the throughput of the string based middle pile check with the
+    Klondike stack_on table lookup the Engine uses.
+    :param bench: The Bench to record into
+    :param number: The number of checks to time
+    """
+    rng = random.Random(0)
+    names = [(suit, value) for suit in c.CARD_SUITS for value in c.CARD_VALUES]
+    pairs = [(rng.randrange(c.CARD_COUNT), rng.randrange(c.CARD_COUNT)) for _ in range(number)]
+    name_pairs = [names[card] + names[other] for card, other in pairs]
+    stack_on = KLONDIKE.stack_on
+    card_count = KLONDIKE.card_count
+
+    start = timeit.default_timer()
+    for card_suit, card_value, top_suit, top_value in name_pairs:
+        legacy_can_stack(card_suit, card_value, top_suit, top_value)
+    bench.batch('validation_strings_legacy', timeit.default_timer() - start, number)
+
+    start = timeit.default_timer()
+    for card, other in pairs:
+        stack_on[card * card_count + other]
+    bench.batch('validation_table', timeit.default_timer() - start, number)
+
+
+def bench_drop(bench, number=2000):
+    """
+    Compare the drop latency of the legacy SpriteList rebuild with DropTable.
+    :param bench: The Bench to record into
+    :param number: The number of drops to time
+    """
+    rng = random.Random(0)
+    mat_positions = [(c.START_X, c.BOTTOM_Y), (c.START_X + c.X_SPACING, c.BOTTOM_Y)]
+    mat_positions += [(c.START_X + i * c.X_SPACING, c.MIDDLE_Y) for i in range(c.MIDDLE_ROW_LEN)]
+    mat_positions += [(c.START_X + i * c.X_SPACING, c.TOP_Y) for i in range(c.TOP_ROW_LEN)]
+
+    card_mats = arcade.SpriteList()
+    for position in mat_positions:
+        mat = arcade.SpriteSolidColor(
+            int(c.CARD_MAT_WIDTH),
+            int(c.CARD_MAT_HEIGHT),
+            arcade.csscolor.MIDNIGHT_BLUE
+        )
+        mat.position = position
+        card_mats.append(mat)
+
+    card_deck = arcade.SpriteList()
+    for suit in c.CARD_SUITS:
+        for value in c.CARD_VALUES:
+            card = Card(suit, value, c.CARD_SCALE)
+            x, y = rng.choice(mat_positions)
+            card.position = x, y - rng.randrange(7) * c.CARD_VERTICAL_FAN
+            card_deck.append(card)
+
+    drop_table = DropTable(mat_positions)
+    for i, (x, y) in enumerate(mat_positions):
+        drop_table.set_top_card(i, (x, y - rng.randrange(7) * c.CARD_VERTICAL_FAN))
+
+    held_card = card_deck[0]
+    held_card.position = mat_positions[5][0] + 10, mat_positions[5][1] - 20
+
+    for _ in range(number):
+        bench.call('drop_spritelist_legacy', legacy_drop, held_card, card_mats, card_deck)
+        bench.call('drop_table', drop_table.resolve, held_card.center_x, held_card.center_y)
+
+
+def bench_pick(bench, variant, deal_number=BENCHMARK_DEAL, number=200, seed=0):
+    """
+    Compare finding the clicked card by testing every card sprite with
+    finding it from the pile layout, over random points on a dealt layout of
+    a variant.
+    :param bench: The Bench to record into
+    :param variant: The Variant to deal
+    :param deal_number: The deal to lay out
+    :param number: The number of points to time
+    :param seed: The seed of the random points
+    """
+    rng = random.Random(seed)
+    engine = Engine(variant=variant)
+    engine.deal(deal_permutation(deal_number, variant.card_count))
+
+    mat_positions = [(c.START_X, c.BOTTOM_Y), (c.START_X + c.X_SPACING, c.BOTTOM_Y)]
+    mat_positions += [(c.START_X + i * c.X_SPACING, c.MIDDLE_Y) for i in range(variant.columns)]
+    mat_positions += [(c.START_X + i * c.X_SPACING, c.TOP_Y) for i in range(variant.foundations)]
+    fans = [c.CARD_VERTICAL_FAN if variant.is_column(i) else 0 for i in range(variant.pile_count)]
+    drop_table = DropTable(mat_positions, fans)
+
+    card_deck = arcade.SpriteList()
+    for pile_index, pile in enumerate(engine.piles):
+        x, y = mat_positions[pile_index]
+        for i, card_id in enumerate(pile):
+            suit, value = divmod(card_id % c.CARD_COUNT, len(c.CARD_VALUES))
+            card = Card(c.CARD_SUITS[suit], c.CARD_VALUES[value], c.CARD_SCALE, card_id // c.CARD_COUNT)
+            card.position = x, y - fans[pile_index] * i
+            card_deck.append(card)
+
+        if pile:
+            drop_table.set_top_card(pile_index, card_deck[-1].position)
+
+    for _ in range(number):
+        x = rng.uniform(0, variant.screen_width)
+        y = rng.uniform(0, c.SCREEN_HEIGHT)
+        bench.call(f'pick_sprites_legacy_{variant.name}', arcade.get_sprites_at_point, (x, y), card_deck)
+        bench.call(f'pick_layout_{variant.name}', drop_table.pick, x, y, engine.piles)
+
+
+def bench_legal_moves(bench, deal_number=BENCHMARK_DEAL, steps=BENCHMARK_STEPS):
+    """
+    Compare listing the legal moves from scratch with updating a
+    MoveGenerator after each move, along the greedy policy's game.
+    :param bench: The Bench to record into
+    :param deal_number: The deal to play
+    :param steps: The number of moves to play
+    """
+    policy = GreedyPolicy(None)
+    engine = Engine()
+    engine.deal(deal_permutation(deal_number))
+    generator = MoveGenerator(engine)
+    move = None
+
+    def incremental():
+        if move is not None:
+            generator.update(move)
+        return generator.legal_moves()
+
+    for _ in range(steps):
+        bench.call('legal_moves_full', engine.legal_moves)
+        bench.call('legal_moves_incremental', incremental)
+        moves = useful_moves(engine)
+
+        if not moves or engine.is_won():
+            engine.deal(deal_permutation(deal_number))
+            generator.refresh()
+            move = None
+            continue
+
+        move = policy.choose(engine, moves)
+        engine.apply(move)
+
+
+def state_features(engine):
+    """
+    The features batch.evaluate computes, for one state with per-card Python
+    loops, as an auto-play heuristic would without the batch API.
+    :param engine: The game Engine
+    :return: The face down counts, foundation lengths, moves per pile and
+    blocked Kings
+    """
+    columns = range(c.MIDDLE_PILE_1, c.MIDDLE_PILE_7 + 1)
+    face_down = [sum(not engine.face_up[card] for card in engine.piles[i]) for i in columns]
+    foundation = [len(engine.piles[i]) for i in range(c.TOP_PILE_1, c.TOP_PILE_4 + 1)]
+    moves = [0] * c.PILE_COUNT
+    for move in engine.legal_moves():
+        moves[move.source] += 1
+
+    blocked_kings = sum(
+        1 for i in columns for card in engine.piles[i][1:]
+        if c.CARD_RANKS[card] == c.KING_RANK
+    )
+    return face_down, foundation, moves, blocked_kings
+
+
+def bench_batch(bench, deal_number=BENCHMARK_DEAL, steps=BENCHMARK_STEPS, size=200_000):
+    """
+    Compare computing heuristic features one state at a time with evaluating
+    a batch of encoded states, over the states of the greedy policy's game.
+    :param bench: The Bench to record into
+    :param deal_number: The deal to play
+    :param steps: The number of moves to play
+    :param size: The number of states in the batch
+    """
+    policy = GreedyPolicy(None)
+    engine = Engine()
+    engine.deal(deal_permutation(deal_number))
+    states = []
+
+    for _ in range(steps):
+        bench.call('features_per_state', state_features, engine)
+        states.append(batch.encode_engine(engine))
+        moves = useful_moves(engine)
+
+        if not moves or engine.is_won():
+            engine.deal(deal_permutation(deal_number))
+            continue
+
+        engine.apply(policy.choose(engine, moves))
+
+    states = np.resize(np.array(states), (size, c.CARD_COUNT))
+    start = time.perf_counter()
+    batch.evaluate(states)
+    bench.batch('features_batch_per_state', time.perf_counter() - start, size)
+
+
+def bench_restart(bench, game, number=50):
+    """
+    Compare restarting by rebuilding every sprite with restarting from the
+    sprite pool.
+    :param bench: The Bench to record into
+    :param game: The Game window
+    :param number: The number of restarts to time
+    """
+    def rebuild():
+        game.card_deck = None
+        game.setup(BENCHMARK_DEAL)
+
+    for _ in range(number):
+        bench.call('restart_rebuild_legacy', rebuild)
+        bench.call('setup', game.setup, BENCHMARK_DEAL)
+
+
+def grab_point(game, card_id):
+    """
+    :return: A point on the visible strip of a card, which is clicked to pick
+    it up
+    """
+    card = game.cards[card_id]
+    return card.center_x, card.center_y + (c.CARD_HEIGHT - c.CARD_VERTICAL_FAN) / 2
+
+
+def drop_point(game, pile_index):
+    """
+    :return: The point a card is dragged to to play it on a pile
+    """
+    pile = game.engine.piles[pile_index]
+
+    if not pile:
+        return game.card_mats[pile_index].position
+
+    top_card = game.cards[pile[-1]]
+    fan = c.CARD_VERTICAL_FAN if c.MIDDLE_PILE_1 <= pile_index <= c.MIDDLE_PILE_7 else 0
+    return top_card.center_x, top_card.center_y - fan
+
+
+def bench_game(bench, game, deal_number=BENCHMARK_DEAL, steps=BENCHMARK_STEPS):
+    """
+    Play a deal with the mouse handlers, following the greedy policy and
+    redealing when the game ends, then cycle the stock with
+    draw_cards_with_skip and flip_deck. Frames are timed until the GPU has
+    finished them: after a move, while dragging, and with nothing changed.
+    :param bench: The Bench to record into
+    :param game: The Game window
+    :param deal_number: The deal to play
+    :param steps: The number of moves to play
+    :raises RuntimeError: If a scripted move is not applied by the game
+    """
+    def draw():
+        game.on_draw()
+        game.ctx.finish()
+
+    policy = GreedyPolicy(None)
+    bench.call('setup', game.setup, deal_number)
+
+    for _ in range(steps):
+        engine = game.engine
+        moves = useful_moves(engine)
+
+        if not moves or engine.is_won():
+            bench.call('setup', game.setup, deal_number)
+            continue
+
+        move = policy.choose(engine, moves)
+        journal_length = len(game.journal)
+
+        if is_stock_move(move):
+            x, y = game.card_mats[c.BOTTOM_FACE_DOWN_PILE].position
+        else:
+            x, y = grab_point(game, engine.piles[move.source][-move.count])
+
+        bench.call('on_mouse_press', game.on_mouse_press, x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+
+        if game.held_cards:
+            target_x, target_y = drop_point(game, move.target)
+            dx = target_x - game.held_cards[0].center_x
+            dy = target_y - game.held_cards[0].center_y
+            bench.call('on_mouse_motion', game.on_mouse_motion, target_x, target_y, dx, dy)
+            bench.call('on_draw_drag', draw)
+            x, y = target_x, target_y
+
+        bench.call('on_mouse_release', game.on_mouse_release, x, y, arcade.MOUSE_BUTTON_LEFT, 0)
+        bench.call('on_draw', draw)
+        bench.call('on_draw_idle', draw)
+
+        if len(game.journal) == journal_length:
+            raise RuntimeError(f'Scripted move {move} was not applied')
+
+    game.setup(deal_number)
+    for _ in range(steps):
+        if game.engine.piles[c.BOTTOM_FACE_DOWN_PILE]:
+            bench.call('draw_cards_with_skip', game.draw_cards_with_skip)
+        else:
+            bench.call('flip_deck', game.flip_deck, c.BOTTOM_FACE_DOWN_PILE)
+
+
+def run(deal_number, steps):
+    """
+    Run every benchmark once for timing and once under tracemalloc, after
+    timing the cold start from opening the window to the end of the first
+    frame.
+    :param deal_number: The deal the game benchmarks play
+    :param steps: The number of moves the game benchmarks play
+    :return: The summarized results
+    """
+    from game import Game
+
+    def open_game():
+        game = Game()
+        game.setup(deal_number)
+        game.on_draw()
+        game.ctx.finish()
+        return game
+
+    benches = (Bench(), Bench(trace_memory=True))
+    game = benches[0].call('first_frame', open_game)
+
+    for bench in benches:
+        if bench.trace_memory:
+            tracemalloc.start()
+
+        bench_validation(bench)
+        bench_drop(bench)
+        bench_pick(bench, KLONDIKE)
+        bench_pick(bench, SPIDER)
+        bench_legal_moves(bench, deal_number, steps)
+        bench_batch(bench, deal_number, steps)
+        bench_restart(bench, game)
+        bench_game(bench, game, deal_number, steps)
+
+        if bench.trace_memory:
+            tracemalloc.stop()
+
+    game.close()
+    return summarize(*benches)
+
+
+def compare(results, baseline, threshold):
+    """
+    :param results: The current results
+    :param baseline: The baseline results
+    :param threshold: The allowed fractional increase in mean latency
+    :return: A list of descriptions of the benchmarks that regressed
+    """
+    regressions = []
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base and result['mean_us'] > base['mean_us'] * (1 + threshold):
+            regressions.append(
+                f'{name}: {result["mean_us"]:.2f} us/call vs baseline {base["mean_us"]:.2f}'
+            )
+
+    return regressions
+
+
+def print_results(results):
+    print(f'{"benchmark":<28} {"ops/s":>12} {"mean us":>10} {"p50 us":>10} '
+          f'{"p95 us":>10} {"KiB/call":>10}')
+
+    for name, result in sorted(results.items()):
+        cells = [
+            f'{value:>10.2f}' if value is not None else f'{"-":>10}'
+            for value in (result['mean_us'], result['p50_us'],
+                          result['p95_us'], result['alloc_kib_per_call'])
+        ]
+        print(f'{name:<28} {result["ops_per_sec"]:>12.0f} ' + ' '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the game against a fixed workload.')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without a display (sets ARCADE_HEADLESS)')
+    parser.add_argument('--deal', type=int, default=BENCHMARK_DEAL,
+                        help='deal played by the game benchmarks')
+    parser.add_argument('--steps', type=int, default=BENCHMARK_STEPS,
+                        help='moves played by the game benchmarks')
+    parser.add_argument('--output', metavar='FILE', default=None,
+                        help='write the results to this JSON file')
+    parser.add_argument('--baseline', metavar='FILE', default=None,
+                        help='JSON baseline to compare the results with')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results to the --baseline file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed fractional increase in mean latency (default 0.25)')
+    args = parser.parse_args()
+
+    results = run(args.deal, args.steps)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+    elif args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
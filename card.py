@@ -1,36 +1,49 @@
 import arcade
 import constants as c
+from engine import card_id
+from textures import face_image_file_name, registry
 
 
 class Card(arcade.Sprite):
     """
     Sprite for a card. Takes a suit parameter and a value parameter, which
-    determine its image file name, and a scale parameter with a default value of
-    1. The is_face_up attribute is set to False by default, so the Card will
+    determine its image file name, its engine card id, its integer rank and its
+    suit color (RED or BLACK), a scale parameter with a default value of 1, and
+    the index of the deck it belongs to in games played with several decks.
+    The is_face_up attribute is set to False by default, so the Card will
     automatically be displayed face down.
     """
-    def __init__(self, suit, value, scale=1):
+    def __init__(self, suit, value, scale=1, deck=0):
         self.suit = suit
         self.value = value
-        self.image_file_name = f'{c.CARD_IMAGE_PATH}{self.suit}{self.value}.png'
+        self.card_id = deck * c.CARD_COUNT + card_id(suit, value)
+        self.rank = c.CARD_RANKS[self.card_id % c.CARD_COUNT]
+        self.suit_color = c.CARD_COLORS[self.card_id % c.CARD_COUNT]
+        self.image_file_name = face_image_file_name(suit, value)
         self.is_face_up = False
 
-        super().__init__(c.FACE_DOWN_IMAGE, scale, hit_box_algorithm='None')
+        super().__init__(
+            scale=scale,
+            hit_box_algorithm='None',
+            texture=registry.get(c.FACE_DOWN_IMAGE)
+        )
 
     def turn_face_down(self):
         """
         Displays the card face down by showing its FACE_DOWN_IMAGE resource and
         setting its is_face_up attribute to False.
         """
-        self.texture = arcade.load_texture(c.FACE_DOWN_IMAGE)
+        self.texture = registry.get(c.FACE_DOWN_IMAGE)
         self.is_face_up = False
 
     def turn_face_up(self):
         """
         Displays the card face up by showing the resource indicated by the card's
         image_file_name attribute and setting its is_face_up attribute to True.
+        While the face image is still loading the back is shown instead; call
+        turn_face_up again once it is ready.
         """
-        self.texture = arcade.load_texture(self.image_file_name)
+        self.texture = registry.find(self.image_file_name) or registry.get(c.FACE_DOWN_IMAGE)
         self.is_face_up = True
 
     @property
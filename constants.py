@@ -3,7 +3,7 @@ SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
 
 # Screen Title (includes game instructions)
-SCREEN_TITLE = 'Drag and Drop Cards. Press "R" to restart.'
+SCREEN_TITLE = 'Drag and Drop Cards. Press "R" to restart, "Z" to undo, "Y" to redo.'
 
 # Card Sprite Sizing
 CARD_SCALE = 0.6
@@ -20,10 +20,24 @@ CARD_VALUES = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
 RED_SUITS = ['Hearts', 'Diamonds']
 BLACK_SUITS = ['Spades', 'Clubs']
 CARD_SUITS = RED_SUITS + BLACK_SUITS
+CARD_COUNT = len(CARD_SUITS) * len(CARD_VALUES)
 CARD_IMAGE_PATH = ':resources:images/cards/card'
 FACE_DOWN_IMAGE = ':resources:images/cards/cardBack_blue5.png'
+TEXTURE_LOADER_THREADS = 4
+TEXTURE_UPLOADS_PER_FRAME = 8
 CARDS_TO_SKIP = 3
 
+# Card Rule Lookup Tables (indexed by card id: suit index * 13 + value index)
+RED = 0
+BLACK = 1
+ACE_RANK = 0
+KING_RANK = len(CARD_VALUES) - 1
+CARD_RANKS = bytes(card % len(CARD_VALUES) for card in range(CARD_COUNT))
+CARD_COLORS = bytes(
+    RED if CARD_SUITS[card // len(CARD_VALUES)] in RED_SUITS else BLACK
+    for card in range(CARD_COUNT)
+)
+
 # Card Row Spacing/Positioning
 HORIZONTAL_MARGIN_PERCENT = 0.1
 VERTICAL_MARGIN_PERCENT = 0.1
@@ -53,3 +67,27 @@ TOP_PILE_1 = 9
 TOP_PILE_2 = 10
 TOP_PILE_3 = 11
 TOP_PILE_4 = 12
+
+# Debugging
+DEBUG_CHECKS = False
+
+# Profiling Overlay
+PROFILER_WINDOW_SIZE = 600
+PROFILER_FONT_SIZE = 10
+PROFILER_TEXT_WIDTH = 420
+PROFILER_MARGIN = 10
+
+# Winnable Deals
+WINNABLE_QUEUE_DEPTH = 4
+WINNABLE_SOLVE_TIMEOUT = 5.0
+WINNABLE_SOLVE_NODES = 200_000
+WINNABLE_PROCESSES = 2
+# Deals the solver has proven winnable, dealt when no new verified deal is ready
+WINNABLE_KNOWN_DEALS = (
+    3, 4, 6, 8, 11, 12, 13, 14, 16, 19, 22, 25, 27, 30, 31, 33, 35, 36, 46, 52,
+    54, 55, 58, 59, 60, 61, 62, 66, 69, 70, 71, 72, 76, 77, 78, 81, 86, 88, 90, 91,
+    93, 94, 95, 102, 104, 107, 110, 111, 114, 115, 117,
+)
+
+# Batch Evaluation
+BATCH_CHUNK_SIZE = 1024
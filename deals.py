@@ -0,0 +1,89 @@
+"""
+Numbered deals. Every deal number maps to one fixed shuffle of the deck, so
+a game can be reproduced or shared by its number alone.
+
+A deal number is hashed with BLAKE2b into a 256 bit integer (or several,
+concatenated, for decks too large for 256 bits), which is rejection sampled
+into a uniform integer below 52! (or n! for n cards) and decoded as the swap
+choices of a Fisher-Yates shuffle. Every ordering of the deck is equally
+likely, and the global random state is never used.
+"""
+import hashlib
+import math
+from functools import lru_cache
+import constants as c
+
+DEAL_NUMBER_LIMIT = 1 << 64
+RANDOM_DEAL_NUMBER_LIMIT = 1 << 32
+PERMUTATION_COUNT = math.factorial(c.CARD_COUNT)
+DIGEST_BITS = 256
+
+
+def _deal_index(deal_number, card_count=c.CARD_COUNT):
+    """
+    :param deal_number: The deal number
+    :param card_count: The number of cards in the deck
+    :return: A uniform integer below card_count! derived from the number
+    """
+    permutation_count = PERMUTATION_COUNT if card_count == c.CARD_COUNT else math.factorial(card_count)
+    blocks = permutation_count.bit_length() // DIGEST_BITS + 1
+    sample_limit = (1 << DIGEST_BITS * blocks) // permutation_count * permutation_count
+    key = deal_number.to_bytes(8, 'little')
+    attempt = 0
+
+    while True:
+        # The first block of every attempt is hashed without a block number,
+        # so that single deck deals are unchanged from one block samples
+        digest = hashlib.blake2b(key + bytes((attempt,)), digest_size=32).digest()
+        for block in range(1, blocks):
+            digest += hashlib.blake2b(key + bytes((attempt, block)), digest_size=32).digest()
+
+        sample = int.from_bytes(digest, 'little')
+
+        if sample < sample_limit:
+            return sample % permutation_count
+
+        attempt += 1
+
+
+@lru_cache(maxsize=256)
+def deal_permutation(deal_number, card_count=c.CARD_COUNT):
+    """
+    Get the deck order of a numbered deal.
+    :param deal_number: An integer from 0 to DEAL_NUMBER_LIMIT - 1
+    :param card_count: The number of cards in the deck, CARD_COUNT times the
+    number of decks
+    :return: A tuple of the card_count card ids in deck order
+    :raises ValueError: If the deal number is out of range
+    """
+    if not 0 <= deal_number < DEAL_NUMBER_LIMIT:
+        raise ValueError(f'Deal numbers range from 0 to {DEAL_NUMBER_LIMIT - 1}')
+
+    index = _deal_index(deal_number, card_count)
+    order = list(range(card_count))
+
+    for i in range(card_count - 1, 0, -1):
+        index, j = divmod(index, i + 1)
+        order[i], order[j] = order[j], order[i]
+
+    return tuple(order)
+
+
+def deal_permutations(first, count):
+    """
+    Generate the deck orders of a range of deals without caching them.
+    :param first: The first deal number
+    :param count: The number of deals
+    :return: A generator of (deal number, deck order) pairs
+    """
+    for deal_number in range(first, first + count):
+        yield deal_number, deal_permutation.__wrapped__(deal_number)
+
+
+def random_deal_number(rng):
+    """
+    Pick a deal number that is short enough to share.
+    :param rng: A random.Random instance
+    :return: A deal number below RANDOM_DEAL_NUMBER_LIMIT
+    """
+    return rng.randrange(RANDOM_DEAL_NUMBER_LIMIT)
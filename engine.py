@@ -0,0 +1,450 @@
+from typing import NamedTuple
+import constants as c
+from variants import KLONDIKE, RUN_LENGTH
+
+
+class Move(NamedTuple):
+    """
+    A single action on the game state. Cards are always taken from the top of
+    the source pile and placed on top of the target pile.
+    source: The index of the pile the cards are taken from
+    target: The index of the pile the cards are placed on
+    count: The number of cards moved
+    flip: True if the moved cards are turned over by the move (stock draws,
+    stock recycles and revealing a tableau card, where source == target)
+    """
+    source: int
+    target: int
+    count: int
+    flip: bool
+
+
+def card_id(suit, value):
+    """
+    Get the integer id of the card with the given suit and value.
+    :param suit: The card suit, one of CARD_SUITS
+    :param value: The card value, one of CARD_VALUES
+    :return: suit index * 13 + value index
+    """
+    return c.CARD_SUITS.index(suit) * len(c.CARD_VALUES) + c.CARD_VALUES.index(value)
+
+
+def card_rank(card):
+    """
+    :param card: A card id
+    :return: The index of the card's value in CARD_VALUES (Ace is 0, King is 12)
+    """
+    return c.CARD_RANKS[card]
+
+
+def card_suit(card):
+    """
+    :param card: A card id
+    :return: The index of the card's suit in CARD_SUITS
+    """
+    return card // len(c.CARD_VALUES)
+
+
+def is_red(card):
+    """
+    :param card: A card id
+    :return: True if the card is a heart or a diamond
+    """
+    return c.CARD_COLORS[card] == c.RED
+
+
+class Engine:
+    """
+    Display-free rules engine for a Variant (Klondike by default). The state
+    is a list of integer card ids per pile (ordered bottom to top, with the
+    piles numbered as described in variants.py) plus a face up flag for each
+    card. The pile_of and position_of arrays index every card's pile and its
+    position in that pile, and are kept up to date by every move. When debug
+    is True the index is checked against the piles after every change.
+    """
+    def __init__(self, debug=c.DEBUG_CHECKS, variant=KLONDIKE):
+        """
+        :param debug: True to check the card index after every change
+        :param variant: The Variant whose rules to apply
+        """
+        self.variant = variant
+        self.card_count = variant.card_count
+        self.pile_count = variant.pile_count
+        self.first_foundation = variant.first_foundation
+        self.spider = variant.spider
+        self.ranks = variant.ranks
+        self.suits = variant.suits
+        self.stack_on = variant.stack_on
+        self.foundation_parent = variant.foundation_parent
+        self.piles = [[] for _ in range(self.pile_count)]
+        self.face_up = bytearray(self.card_count)
+        self.pile_of = bytearray(self.card_count)
+        self.position_of = bytearray(self.card_count)
+        self.debug = debug
+
+    def deal(self, order):
+        """
+        Deal a new game: every card is placed face down on the bottom face
+        down pile in the given order, then the columns are dealt from the top
+        of it with the last card of each column turned face up.
+        :param order: The card ids in deck order
+        """
+        self.piles = [[] for _ in range(self.pile_count)]
+        self.face_up = bytearray(self.card_count)
+        stock = self.piles[c.BOTTOM_FACE_DOWN_PILE]
+        stock.extend(order)
+
+        for i, size in enumerate(self.variant.column_sizes):
+            pile = self.piles[c.MIDDLE_PILE_1 + i]
+            for _ in range(size):
+                pile.append(stock.pop())
+
+            self.face_up[pile[-1]] = True
+
+        for pile_index in range(self.pile_count):
+            self.index_pile(pile_index)
+
+        if self.debug:
+            self.check_index()
+
+    def set_state(self, piles, face_up):
+        """
+        Replace the whole game state.
+        :param piles: A list of card ids for each pile, ordered bottom to top
+        :param face_up: A face up flag for each card id
+        """
+        self.piles = piles
+        self.face_up = bytearray(face_up)
+
+        for pile_index in range(self.pile_count):
+            self.index_pile(pile_index)
+
+        if self.debug:
+            self.check_index()
+
+    def index_pile(self, pile_index, start=0):
+        """
+        Record the pile and position of the cards of a pile in the card index.
+        :param pile_index: The index of the pile
+        :param start: The position of the first card to record; the cards
+        below it are assumed to be indexed already
+        """
+        pile = self.piles[pile_index]
+        pile_of = self.pile_of
+        position_of = self.position_of
+
+        for position in range(start, len(pile)):
+            card = pile[position]
+            pile_of[card] = pile_index
+            position_of[card] = position
+
+    def check_index(self):
+        """
+        Verify that the card index agrees with the piles and that every card is
+        in exactly one pile.
+        :raises RuntimeError: If the index and the piles disagree
+        """
+        seen = bytearray(self.card_count)
+
+        for pile_index, pile in enumerate(self.piles):
+            for position, card in enumerate(pile):
+                if seen[card]:
+                    raise RuntimeError(f'Card {card} is in more than one pile')
+                seen[card] = True
+
+                if self.pile_of[card] != pile_index or self.position_of[card] != position:
+                    raise RuntimeError(
+                        f'Card {card} is indexed at pile {self.pile_of[card]} '
+                        f'position {self.position_of[card]} but is at pile '
+                        f'{pile_index} position {position}'
+                    )
+
+        if not all(seen):
+            raise RuntimeError('Some cards are not in any pile')
+
+    def get_pile_for_card(self, card):
+        """
+        Identify the pile holding a given card.
+        :param card: The card id to search for
+        :return: The index of the pile holding the card
+        """
+        return self.pile_of[card]
+
+    def cards_above(self, card):
+        """
+        Get a card and every card stacked on top of it.
+        :param card: The card id
+        :return: A list of card ids, ordered bottom to top
+        """
+        return self.piles[self.pile_of[card]][self.position_of[card]:]
+
+    def top_card(self, pile_index):
+        """
+        :param pile_index: The index of the pile
+        :return: The id of the top card of the pile, or None if it is empty
+        """
+        pile = self.piles[pile_index]
+        return pile[-1] if pile else None
+
+    def can_play_to_middle(self, card, pile_index):
+        """
+        Checks the validity of moves to the middle play section. For a move to pass:
+        1. In Klondike, the card cannot be an Ace.
+        2. If the new pile is empty, the card must be a King (any card in
+        Spider).
+        3. If the new pile is not empty:
+        - In Klondike, the top card must be the opposite color of the played
+        card
+        - The played card must be 1 value lower than the top card
+        :param card: The bottom card of the moved stack
+        :param pile_index: The middle pile the stack is moved to
+        :return: True if the move is valid, False if not
+        """
+        pile = self.piles[pile_index]
+        if not pile:
+            return self.spider or self.ranks[card] == c.KING_RANK
+
+        return self.stack_on[card * self.card_count + pile[-1]] == 1
+
+    def can_play_to_top(self, card, count, pile_index):
+        """
+        Checks the validity of moves to the top play section. For a move to pass
+        in Klondike:
+        1. Only a single card can be moved.
+        2. If the new pile is empty, the card must be an Ace.
+        3. If the new pile is not empty:
+        - The top card must be the same suit as the played card
+        - The played card must be 1 value higher than the top card
+        In Spider, a whole run from a King down to an Ace must be moved to an
+        empty pile (the run itself is checked when it is picked up).
+        :param card: The moved card
+        :param count: The number of cards moved
+        :param pile_index: The top pile the card is moved to
+        :return: True if the move is valid, False if not
+        """
+        pile = self.piles[pile_index]
+
+        if self.spider:
+            return count == RUN_LENGTH and not pile and self.ranks[card] == c.KING_RANK
+
+        if count != 1:
+            return False
+
+        if not pile:
+            return self.ranks[card] == c.ACE_RANK
+
+        return self.foundation_parent[card * self.card_count + pile[-1]] == 1
+
+    def is_run(self, pile_index, position):
+        """
+        Check that the cards from a position to the top of a pile can be
+        picked up together: in Klondike any face up cards, in Spider a run of
+        one suit going down one value at a time.
+        :param pile_index: The index of the pile
+        :param position: The position of the lowest card
+        :return: True if the cards form a run
+        """
+        pile = self.piles[pile_index]
+        face_up = self.face_up
+
+        if not self.spider:
+            return face_up[pile[position]] == 1
+
+        ranks = self.ranks
+        suits = self.suits
+        for i in range(position, len(pile) - 1):
+            card = pile[i]
+            above = pile[i + 1]
+            if not face_up[card] or suits[card] != suits[above] or ranks[card] != ranks[above] + 1:
+                return False
+
+        return face_up[pile[-1]] == 1
+
+    def stock_move(self):
+        """
+        :return: The move that draws from the stock (or, in Spider, deals a
+        card onto every column), or recycles the waste when the stock is
+        empty, or None if neither is possible
+        """
+        stock = self.piles[c.BOTTOM_FACE_DOWN_PILE]
+
+        if self.spider:
+            if stock and all(self.piles[c.MIDDLE_PILE_1:self.first_foundation]):
+                return Move(c.BOTTOM_FACE_DOWN_PILE, c.BOTTOM_FACE_DOWN_PILE, self.variant.columns, True)
+            return None
+
+        if stock:
+            return Move(
+                c.BOTTOM_FACE_DOWN_PILE,
+                c.BOTTOM_FACE_UP_PILE,
+                min(self.variant.draw_count, len(stock)),
+                True
+            )
+
+        waste = self.piles[c.BOTTOM_FACE_UP_PILE]
+        if waste:
+            return Move(c.BOTTOM_FACE_UP_PILE, c.BOTTOM_FACE_DOWN_PILE, len(waste), True)
+
+        return None
+
+    def is_legal(self, move):
+        """
+        Check whether a move can be applied to the current state.
+        :param move: The Move to check
+        :return: True if the move is valid, False if not
+        """
+        source, target, count, flip = move
+
+        if not 0 <= source < self.pile_count or not 0 <= target < self.pile_count:
+            return False
+
+        source_pile = self.piles[source]
+
+        if count < 1 or count > len(source_pile):
+            return False
+
+        if source == c.BOTTOM_FACE_DOWN_PILE or flip and target == c.BOTTOM_FACE_DOWN_PILE:
+            return move == self.stock_move()
+
+        if flip:
+            return source == target and count == 1 \
+                and c.BOTTOM_FACE_UP_PILE <= source < self.first_foundation \
+                and not self.face_up[source_pile[-1]]
+
+        if not c.BOTTOM_FACE_UP_PILE <= source < self.first_foundation or source == target:
+            return False
+
+        if source == c.BOTTOM_FACE_UP_PILE and count != 1:
+            return False
+
+        position = len(source_pile) - count
+        if not self.is_run(source, position):
+            return False
+
+        card = source_pile[position]
+        if target < self.first_foundation:
+            return target >= c.MIDDLE_PILE_1 and self.can_play_to_middle(card, target)
+
+        return self.can_play_to_top(card, count, target)
+
+    def legal_moves(self):
+        """
+        List every move that can be applied to the current state.
+        :return: A list of Moves
+        """
+        moves = []
+        stock_move = self.stock_move()
+        if stock_move is not None:
+            moves.append(stock_move)
+
+        first_foundation = self.first_foundation
+        columns = range(c.MIDDLE_PILE_1, first_foundation)
+        foundations = range(first_foundation, self.pile_count)
+        foundation_count = RUN_LENGTH if self.spider else 1
+        spider = self.spider
+        face_up = self.face_up
+        ranks = self.ranks
+        suits = self.suits
+
+        for source in range(c.BOTTOM_FACE_UP_PILE, first_foundation):
+            pile = self.piles[source]
+            if not pile:
+                continue
+
+            if not face_up[pile[-1]]:
+                moves.append(Move(source, source, 1, True))
+                continue
+
+            lowest = len(pile) - 1 if source == c.BOTTOM_FACE_UP_PILE else 0
+            for position in range(len(pile) - 1, lowest - 1, -1):
+                card = pile[position]
+                if not face_up[card]:
+                    break
+
+                if spider and position < len(pile) - 1:
+                    above = pile[position + 1]
+                    if suits[card] != suits[above] or ranks[card] != ranks[above] + 1:
+                        break
+
+                count = len(pile) - position
+                for target in columns:
+                    if target != source and self.can_play_to_middle(card, target):
+                        moves.append(Move(source, target, count, False))
+
+                if count == foundation_count:
+                    for target in foundations:
+                        if self.can_play_to_top(card, count, target):
+                            moves.append(Move(source, target, count, False))
+
+        return moves
+
+    def apply(self, move):
+        """
+        Apply a move to the state. The move is not validated; use is_legal or
+        legal_moves to check it first.
+        :param move: The Move to apply
+        """
+        source, target, count, flip = move
+        source_pile = self.piles[source]
+
+        if source == target:
+            if source == c.BOTTOM_FACE_DOWN_PILE:
+                for pile_index in range(c.MIDDLE_PILE_1, c.MIDDLE_PILE_1 + count):
+                    card = source_pile.pop()
+                    self.face_up[card] = True
+                    self.piles[pile_index].append(card)
+                    self.index_pile(pile_index, len(self.piles[pile_index]) - 1)
+            else:
+                self.face_up[source_pile[-1]] = True
+
+            if self.debug:
+                self.check_index()
+            return
+
+        target_pile = self.piles[target]
+        start = len(target_pile)
+
+        if flip:
+            face_up = target == c.BOTTOM_FACE_UP_PILE
+            for _ in range(count):
+                card = source_pile.pop()
+                self.face_up[card] = face_up
+                target_pile.append(card)
+        else:
+            target_pile.extend(source_pile[-count:])
+            del source_pile[-count:]
+
+        self.index_pile(target, start)
+
+        if self.debug:
+            self.check_index()
+
+    def undo(self, move):
+        """
+        Revert a move that was the last one applied to the state.
+        :param move: The Move to revert
+        """
+        source, target, count, flip = move
+
+        if source != target:
+            self.apply(Move(target, source, count, flip))
+        elif source == c.BOTTOM_FACE_DOWN_PILE:
+            stock = self.piles[source]
+            for pile_index in range(c.MIDDLE_PILE_1 + count - 1, c.MIDDLE_PILE_1 - 1, -1):
+                card = self.piles[pile_index].pop()
+                self.face_up[card] = False
+                stock.append(card)
+
+            self.index_pile(source, len(stock) - count)
+        else:
+            self.face_up[self.piles[source][-1]] = False
+
+        if self.debug:
+            self.check_index()
+
+    def is_won(self):
+        """
+        :return: True if every card has been played to the top piles
+        """
+        return sum(len(self.piles[i]) for i in range(self.first_foundation, self.pile_count)) \
+            == self.card_count
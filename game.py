@@ -1,43 +1,84 @@
 import arcade
+import os
 import random
+import time
 import constants as c
 from card import Card
+from deals import deal_permutation, random_deal_number
+from engine import Engine, Move
+from journal import Journal
+from layout import DropTable
+from movegen import MoveGenerator
+from packed import pack, unpack
+from profiler import Profiler, profiled
+from replay import ReplayWriter, apply_event, iter_events, read_header
+from textures import registry
+from variants import KLONDIKE
 
 
 class Game(arcade.Window):
     """
-    Main window in which the game is displayed and played.
+    Main window in which the game is displayed and played. The game state and
+    move rules are held by an Engine; the window only keeps the card sprites in
+    step with it, and a MoveGenerator keeps the legal moves of the current
+    state ready for every frame.
     """
-    def __init__(self):
+    def __init__(self, replay_directory=None, prefetcher=None, variant=KLONDIKE):
+        """
+        :param replay_directory: The directory in which to record a replay of
+        every game, or None to not record (replays are only recorded for
+        Klondike, as their header holds only the deal number)
+        :param prefetcher: A prefetch.DealPrefetcher to take random deals
+        from, so that they are known to be winnable, or None to deal any
+        random deal
+        :param variant: The Variant to play (see variants.py)
+        """
+        self.start_time = time.perf_counter()
+        self.first_frame_drawn = False
+        registry.preload_async()
+
         self.card_deck = None
+        self.cards = None
+        self.card_depth = None
         self.held_cards = None
         self.held_cards_initial_position = None
+        self.held_card_list = None
+        self.static_layer = None
+        self.static_layer_dirty = True
         self.card_mats = None
-        self.card_piles = None
-
-        super().__init__(c.SCREEN_WIDTH, c.SCREEN_HEIGHT, c.SCREEN_TITLE)
+        self.drop_table = None
+        self.variant = variant
+        self.engine = Engine(variant=variant)
+        self.move_generator = MoveGenerator(self.engine)
+        self.journal = Journal()
+        self.rng = random.Random()
+        self.deal_number = None
+        self.replay_directory = replay_directory
+        self.prefetcher = prefetcher
+        self.recorder = None
+        self.profiler = Profiler()
+        self.show_profiler = False
+        self.profiler_text = None
+
+        super().__init__(variant.screen_width, c.SCREEN_HEIGHT, c.SCREEN_TITLE)
         arcade.set_background_color(arcade.color.CERULEAN_FROST)
 
     def create_deck(self):
         """
         Creates a Card Sprite with each possible card value for each possible
-        card suit and adds each card to the card_deck.
+        card suit, for each deck the variant is played with, and adds each card
+        to the card_deck.
         """
         self.card_deck = arcade.SpriteList()
-        for suit in c.CARD_SUITS:
-            for value in c.CARD_VALUES:
-                card = Card(suit, value, c.CARD_SCALE)
-                card.position = c.START_X, c.BOTTOM_Y
-                self.card_deck.append(card)
-
-    def shuffle_deck(self):
-        """
-        Shuffles the deck of cards by taking each card and swapping its position
-        with that of another, randomly selected card.
-        """
-        for pos1 in range(len(self.card_deck)):
-            pos2 = random.randrange(len(self.card_deck))
-            self.card_deck.swap(pos1, pos2)
+        self.cards = []
+        self.card_depth = [0] * self.variant.card_count
+        for deck in range(self.variant.decks):
+            for suit in c.CARD_SUITS:
+                for value in c.CARD_VALUES:
+                    card = Card(suit, value, c.CARD_SCALE, deck)
+                    card.position = c.START_X, c.BOTTOM_Y
+                    self.card_deck.append(card)
+                    self.cards.append(card)
 
     def define_card_mat(self):
         """
@@ -64,8 +105,8 @@ class Game(arcade.Window):
     def create_card_mats(self):
         """
         Create the rows of card mat sprites on which the cards will be rendered.
-        These include: the bottom face down pile, the bottom face down pile, the
-        7 middle piles and the 4 top piles.
+        These include: the bottom face down pile, the bottom face up pile (hidden
+        in variants without one), the middle piles and the top piles.
         """
         bottom_fdown_pile = self.define_card_mat()
 
@@ -74,11 +115,21 @@ class Game(arcade.Window):
 
         pile = self.define_card_mat()
         pile.position = c.START_X + c.X_SPACING, c.BOTTOM_Y
+        pile.visible = not self.variant.spider
         self.card_mats.append(pile)
 
-        self.create_card_row(c.MIDDLE_ROW_LEN, c.MIDDLE_Y)
+        self.create_card_row(self.variant.columns, c.MIDDLE_Y)
 
-        self.create_card_row(c.TOP_ROW_LEN, c.TOP_Y)
+        self.create_card_row(self.variant.foundations, c.TOP_Y)
+
+    @property
+    def card_piles(self):
+        """
+        The Card sprites in each pile, ordered bottom to top, as held by the
+        rules engine.
+        :return: A list of PILE_COUNT lists of Cards
+        """
+        return [[self.cards[card_id] for card_id in pile] for pile in self.engine.piles]
 
     def get_pile_for_card(self, card):
         """
@@ -87,230 +138,179 @@ class Game(arcade.Window):
         :return: The card's index in the pile list, or None if the card is not
         present
         """
-        for i, pile in enumerate(self.card_piles):
-            if card in pile:
-                return i
-
-        return None
+        return self.engine.get_pile_for_card(card.card_id)
 
-    def remove_card_from_pile(self, card):
+    def restack(self, lifted_cards=()):
         """
-        Searches the card piles for the given card, and removes the card from
-        its pile if found.
-        :param card: The card to search for and remove
+        Reorders the card sprites in a single batch so that they are drawn pile
+        by pile from the bottom card up, with any lifted cards drawn on top of
+        everything else.
+        :param lifted_cards: The cards to draw last, in order
         """
-        for pile in self.card_piles:
-            if card in pile:
-                pile.remove(card)
-                break
+        depth = self.card_depth
+        i = 0
+
+        for pile in self.engine.piles:
+            for card_id in pile:
+                depth[card_id] = i
+                i += 1
+
+        for card in lifted_cards:
+            depth[card.card_id] = i
+            i += 1
 
-    def move_card_to_pile(self, card, pile_index):
+        self.card_deck.sort(key=lambda card: depth[card.card_id])
+        self.static_layer_dirty = True
+
+    def layout_pile(self, pile_index):
         """
-        Move a given card from its current pile to a new one.
-        :param card: The card to move
-        :param pile_index: The index of the new pile where the card is being moved
+        Positions the card sprites of a pile on its mat, fanning them downwards
+        in the middle piles, shows each card face up or face down according to
+        the game state and updates the pile's drop area.
+        :param pile_index: The index of the pile to lay out
         """
-        self.remove_card_from_pile(card)
-        self.card_piles[pile_index].append(card)
+        card_mat = self.card_mats[pile_index]
+        pile = self.engine.piles[pile_index]
+        fan = c.CARD_VERTICAL_FAN if self.variant.is_column(pile_index) else 0
+
+        for i, card_id in enumerate(pile):
+            card = self.cards[card_id]
+            card.position = card_mat.center_x, card_mat.center_y - fan * i
+
+            if self.engine.face_up[card_id] and card.is_face_down:
+                card.turn_face_up()
+            elif not self.engine.face_up[card_id] and card.is_face_up:
+                card.turn_face_down()
 
-    def pull_card_to_top(self, card: arcade.Sprite):
+        top_card_position = self.cards[pile[-1]].position if pile else None
+        self.drop_table.set_top_card(pile_index, top_card_position)
+        self.static_layer_dirty = True
+
+    def layout_move(self, move):
         """
-        Pulls the selected card to the top of the list
-        :param card: The selected card
+        Lays out the piles changed by a move: its source and target piles, and
+        every middle pile for a Spider deal.
+        :param move: The engine Move that was applied or undone
         """
-        self.card_deck.remove(card)
-        self.card_deck.append(card)
+        self.layout_pile(move.source)
+        self.layout_pile(move.target)
+
+        if move.source == move.target == c.BOTTOM_FACE_DOWN_PILE:
+            for pile_index in range(c.MIDDLE_PILE_1, self.variant.first_foundation):
+                self.layout_pile(pile_index)
 
-    def validate_color(self, pile_index):
+    def apply_move(self, move):
         """
-        Check that the currently held card is the opposite color from the top
-        card on its new pile.
-        :param pile_index: The pile on which the card is being placed
-        :return: True if the colors do not match (move is valid), False if not
+        Applies a move to the game state, records it in the journal and lays
+        out the piles it changed.
+        :param move: The engine Move to apply
         """
-        top_card_suit = self.card_piles[pile_index][-1].suit
-        held_card_suit = self.held_cards[0].suit
-        red_on_black = held_card_suit in c.RED_SUITS and top_card_suit in c.BLACK_SUITS
-        black_on_red = held_card_suit in c.BLACK_SUITS and top_card_suit in c.RED_SUITS
+        self.engine.apply(move)
+        self.move_generator.update(move)
+        self.journal.record(move)
+        self.layout_move(move)
+        self.restack()
 
-        return red_on_black or black_on_red
+        if self.recorder is not None:
+            self.recorder.write_move(move)
 
-    def check_card_order(self, top_card):
+    def undo_move(self):
         """
-        Get the difference in positions (indices) of the top card's value and
-        the currently held card's value.
-        :param top_card: The top card in the pile to which the held card is
-        being moved
-        :return: The difference between the top card value index and the held
-        card value index
+        Reverts the last move in the journal, if any.
         """
-        top_card_index = c.CARD_VALUES.index(top_card.value)
-        held_card_index = c.CARD_VALUES.index(self.held_cards[0].value)
+        move = self.journal.undo()
+
+        if move is not None:
+            if self.recorder is not None:
+                self.recorder.write_undo()
 
-        return top_card_index - held_card_index
+            self.engine.undo(move)
+            self.move_generator.update(move)
+            self.layout_move(move)
+            self.restack()
 
-    def move_card(self, card, card_pile, new_x, new_y):
+    def redo_move(self):
         """
-        Moves a selected card to a new pile by updating the card sprite's
-        position and moving the sprite to the list corresponding to the new pile.
-        :param card: The card being moved
-        :param card_pile: The pile to which the card is being moved
-        :param new_x: The card's updated x coordinate
-        :param new_y: The card's updated y coordinate
+        Applies the last undone move in the journal again, if any.
         """
-        pile_index = self.card_mats.index(card_pile)
-        card.position = new_x, new_y
-        self.move_card_to_pile(card, pile_index)
+        move = self.journal.redo()
 
-    def play_to_middle(self, card_pile):
+        if move is not None:
+            if self.recorder is not None:
+                self.recorder.write_redo()
+
+            self.engine.apply(move)
+            self.move_generator.update(move)
+            self.layout_move(move)
+            self.restack()
+
+    def play_held_cards(self, pile_index):
         """
-        Checks the validity of moves to the middle play section. For a move to pass:
-        1. The card cannot be an Ace.
-        2. If the new pile is empty, the card must be a King.
-        3. If the new pile is not empty:
-        - The top card must be the opposite color of the played card
-        - The played card must be 1 value lower than the top card
-        :param card_pile: The Sprite for the pile on which the card sprite is
+        Moves the held cards to a new pile if the rules allow it (see
+        Engine.can_play_to_middle and Engine.can_play_to_top).
+        :param pile_index: The index of the pile on which the held cards are
         placed
-        :return: True if the move is valid, False if not
-        """
-        reset_move = True
-        pile_index = self.card_mats.index(card_pile)
-
-        if self.held_cards[0].value == 'A' or self.held_cards[0].is_face_down:
-            pass
-        elif len(self.card_piles[pile_index]) > 0:
-            top_card = self.card_piles[pile_index][-1]
-
-            if self.validate_color(pile_index) \
-                    and self.check_card_order(top_card) == 1:
-                for i, dropped_card in enumerate(self.held_cards):
-                    fan_offset = c.CARD_VERTICAL_FAN * (i + 1)
-                    self.move_card(
-                        dropped_card,
-                        card_pile,
-                        top_card.center_x,
-                        top_card.center_y - fan_offset
-                    )
-
-                reset_move = False
-        else:
-            if self.held_cards[0].value == 'K':
-                for i, dropped_card in enumerate(self.held_cards):
-                    fan_offset = c.CARD_VERTICAL_FAN * i
-                    self.move_card(
-                        dropped_card,
-                        card_pile,
-                        card_pile.center_x,
-                        card_pile.center_y - fan_offset
-                    )
+        :return: True if the held cards must be sent back (move is invalid),
+        False if they were moved
+        """
+        source = self.get_pile_for_card(self.held_cards[0])
+        move = Move(source, pile_index, len(self.held_cards), False)
 
-                reset_move = False
+        if not self.engine.is_legal(move):
+            return True
 
-        return reset_move
+        self.apply_move(move)
+        return False
 
-    def play_to_top(self, card_pile):
+    def clear_held_cards(self):
         """
-        Checks the validity of moves to the top play section. For a move to pass:
-        1. If the new pile is empty, the card must be an Ace.
-        2. If the new pile is not empty:
-        - The top card must be the same suit as the played card
-        - The played card must be 1 value higher than the top card
-        :param card_pile: The Sprite for the pile on which the card sprite is
-        placed.
-        :return: True if the move is valid, false if not
+        Lets go of the held cards, if any, so that they are drawn in the static
+        layer again.
         """
-        reset_position = True
-        primary_held_card = self.held_cards[0]
-        pile_index = self.card_mats.index(card_pile)
-        new_pile = self.card_piles[pile_index]
-
-        if len(self.held_cards) == 1:
-            if len(new_pile) == 0:
-                if primary_held_card.value == 'A':
-                    self.move_card(
-                        primary_held_card,
-                        card_pile,
-                        card_pile.center_x,
-                        card_pile.center_y
-                    )
+        if self.held_cards:
+            self.static_layer_dirty = True
 
-                    reset_position = False
-            else:
-                top_card = self.card_piles[pile_index][-1]
-                if self.check_card_order(top_card) == -1 \
-                        and top_card.suit == primary_held_card.suit:
-                    self.move_card(
-                        primary_held_card,
-                        card_pile,
-                        card_pile.center_x,
-                        card_pile.center_y
-                    )
-
-                    reset_position = False
+        self.held_cards = []
+        self.held_cards_initial_position = []
 
-        return reset_position
+        while len(self.held_card_list) > 0:
+            self.held_card_list.pop()
 
     def update_card_position(self):
         """
-        Checks to see if the held card is touching a mat sprite or a card sprite.
-        If the card is touching another sprite, its position is updated to match
-        the closest card mat's position, otherwise the card is sent back to its
-        initial position.
+        Checks to see if the held card is touching a card mat or the top card of
+        a pile. If it is, the held cards are played to the closest such pile,
+        otherwise (or if the move is invalid) they are sent back to their
+        initial positions.
         """
         primary_held_card = self.held_cards[0]
-
-        closest_card_pile, distance = arcade.get_closest_sprite(
-            primary_held_card,
-            self.card_mats
-        )
-
-        other_card_sprites = arcade.SpriteList()
-        for card in self.card_deck:
-            if card != primary_held_card:
-                other_card_sprites.append(card)
-
-        closest_card_sprite, sprite_distance = arcade.get_closest_sprite(
-            primary_held_card,
-            other_card_sprites
+        pile_index = self.drop_table.resolve(
+            primary_held_card.center_x,
+            primary_held_card.center_y
         )
 
         reset_position = True
 
-        if arcade.check_for_collision(primary_held_card, closest_card_pile) \
-                or arcade.check_for_collision(primary_held_card, closest_card_sprite):
-            pile_index = self.card_mats.index(closest_card_pile)
-
-            if pile_index == self.get_pile_for_card(primary_held_card):
-                pass
-            elif c.MIDDLE_PILE_1 <= pile_index <= c.MIDDLE_PILE_7:
-                reset_position = self.play_to_middle(closest_card_pile)
-            elif c.TOP_PILE_1 <= pile_index <= c.TOP_PILE_4:
-                reset_position = self.play_to_top(closest_card_pile)
+        if pile_index is not None \
+                and pile_index != self.get_pile_for_card(primary_held_card):
+            reset_position = self.play_held_cards(pile_index)
 
         if reset_position:
             for i, card in enumerate(self.held_cards):
                 card.position = self.held_cards_initial_position[i]
 
-    def draw_cards_with_skip(self, card_pile):
+    def draw_cards_with_skip(self):
         """
-        Draws CARDS_TO_SKIP cards from the bottom face down mat and places them face up
-        on the bottom face up mat, with the last card on top.
-        :param card_pile: The card pile from which the cards are drawn
+        Draws the variant's draw count of cards (CARDS_TO_SKIP by default) from
+        the bottom face down mat and places them face up on the bottom face up
+        mat, with the last card on top. In Spider, deals a card face up onto
+        every middle pile instead.
         """
-        card_mat = self.card_mats[c.BOTTOM_FACE_UP_PILE]
-        for i in range(c.CARDS_TO_SKIP):
-            if len(card_pile) == 0:
-                break
-            top_card = card_pile[-1]
-            top_card.turn_face_up()
-            self.move_card(
-                top_card,
-                card_mat,
-                card_mat.center_x,
-                card_mat.center_y
-            )
-            self.pull_card_to_top(top_card)
+        move = self.engine.stock_move()
+        if move is None or move.source != c.BOTTOM_FACE_DOWN_PILE:
+            return
+
+        self.apply_move(move)
 
     def flip_deck(self, mat_index):
         """
@@ -320,63 +320,246 @@ class Game(arcade.Window):
         (the function only runs when the mat in the bottom left corner is clicked
         while empty).
         """
-        bottom_left_pile = self.card_piles[c.BOTTOM_FACE_DOWN_PILE]
-        bottom_right_pile = self.card_piles[c.BOTTOM_FACE_UP_PILE]
-        bottom_left_mat = self.card_mats[c.BOTTOM_FACE_DOWN_PILE]
+        if mat_index != c.BOTTOM_FACE_DOWN_PILE:
+            return
+
+        move = self.engine.stock_move()
+        if move is not None and move.source == c.BOTTOM_FACE_UP_PILE:
+            self.apply_move(move)
+
+    @profiled('setup')
+    def setup(self, deal_number=None):
+        """
+        Display the initial game state: all the rows are dealt out with the
+        remaining cards in the bottom face down pile. The card and mat sprites
+        are created on the first call only; restarting reshuffles and
+        repositions the existing sprites.
+        :param deal_number: The numbered deal to play (see deals.py), or None
+        to pick one at random: a winnable deal from the prefetcher if there is
+        one, otherwise any deal
+        """
+        if self.card_deck is None:
+            self.card_mats: arcade.SpriteList = arcade.SpriteList()
+            self.held_card_list = arcade.SpriteList()
+            self.create_deck()
+            self.create_card_mats()
+            self.drop_table = DropTable(
+                [mat.position for mat in self.card_mats],
+                [c.CARD_VERTICAL_FAN if self.variant.is_column(i) else 0
+                 for i in range(self.variant.pile_count)]
+            )
 
-        if mat_index == c.BOTTOM_FACE_DOWN_PILE and len(bottom_left_pile) == 0:
-            temp_list = bottom_right_pile.copy()
+        self.clear_held_cards()
 
-            for card in reversed(temp_list):
-                card.turn_face_down()
-                self.move_card(
-                    card,
-                    bottom_left_mat,
-                    bottom_left_mat.center_x,
-                    bottom_left_mat.center_y
-                )
+        winnable = False
+
+        if deal_number is None and self.prefetcher is not None:
+            deal_number = self.prefetcher.pop()
+            winnable = True
+        elif deal_number is None:
+            deal_number = random_deal_number(self.rng)
+
+        self.deal_number = deal_number
+        suffix = ' (winnable)' if winnable else ''
+        self.set_caption(f'{c.SCREEN_TITLE} {self.variant.title} Deal #{deal_number}{suffix}')
+        self.engine.deal(deal_permutation(deal_number, self.variant.card_count))
+        self.move_generator.refresh()
+        self.journal.clear()
+        self.start_recording()
+
+        for pile_index in range(self.engine.pile_count):
+            self.layout_pile(pile_index)
 
-    def setup(self):
+        self.restack()
+
+    def start_recording(self):
         """
-        Create the deck of cards and display the initial game state: all the
-        rows are dealt out with the remaining cards in the bottom face down
-        pile.
+        Closes the current replay, if any, and starts recording the current
+        deal to a new file in the replay directory. Games started in the same
+        second get a counter suffix rather than overwriting each other.
         """
-        self.held_cards = []
-        self.held_cards_initial_position = []
-        self.card_piles = [[] for _ in range(c.PILE_COUNT)]
-        self.card_mats: arcade.SpriteList = arcade.SpriteList()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+        if self.replay_directory is not None and self.variant is KLONDIKE:
+            os.makedirs(self.replay_directory, exist_ok=True)
+            stem = f'{time.strftime("%Y%m%d-%H%M%S")}-deal{self.deal_number}'
+            suffix = ''
+            attempt = 0
+
+            while self.recorder is None:
+                try:
+                    self.recorder = ReplayWriter(
+                        os.path.join(self.replay_directory, f'{stem}{suffix}.klr'),
+                        self.deal_number
+                    )
+                except FileExistsError:
+                    attempt += 1
+                    suffix = f'-{attempt}'
 
-        self.create_deck()
-        self.shuffle_deck()
-        self.create_card_mats()
+    def load_replay(self, path, event_count=None):
+        """
+        Deals the game recorded in a replay file and fast-forwards through its
+        events with the rules engine, without drawing the intermediate states,
+        so that play can resume from there.
+        :param path: The replay file
+        :param event_count: The number of events to play, or None for all of
+        them
+        :raises ValueError: If the game is not playing Klondike, the only
+        variant replays are recorded for
+        """
+        if self.variant is not KLONDIKE:
+            raise ValueError(f'Cannot play a replay in {self.variant.title}')
+
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        deal_number, offset = read_header(data)
+        self.setup(deal_number)
+
+        for i, event in enumerate(iter_events(data, offset)):
+            if event_count is not None and i >= event_count:
+                break
+
+            apply_event(self.engine, self.journal, event)
+
+            if self.recorder is not None:
+                self.recorder.write_event(event)
+
+        self.move_generator.refresh()
+
+        for pile_index in range(self.engine.pile_count):
+            self.layout_pile(pile_index)
+
+        self.restack()
+
+    def snapshot(self):
+        """
+        Get a compact copy of the current game state.
+        :return: The packed state bytes (see packed.pack)
+        """
+        return pack(self.engine)
 
-        for card in self.card_deck:
-            self.card_piles[c.BOTTOM_FACE_DOWN_PILE].append(card)
+    def restore(self, snapshot):
+        """
+        Replace the current game state with a snapshot and move the card
+        sprites to match it.
+        :param snapshot: Packed state bytes from snapshot or packed.pack
+        :raises ValueError: If the snapshot cannot be loaded into this variant
+        """
+        unpack(snapshot, self.engine)
+        self.move_generator.refresh()
+        self.journal.clear()
+        self.clear_held_cards()
+
+        for pile_index in range(self.engine.pile_count):
+            self.layout_pile(pile_index)
+
+        self.restack()
+
+    def render_static_layer(self):
+        """
+        Renders the background, the mats and every card that is not held into
+        the static layer framebuffer, creating it the first time.
+        """
+        if self.static_layer is None:
+            self.static_layer = self.ctx.framebuffer(
+                color_attachments=[self.ctx.texture(self.get_framebuffer_size(), components=4)]
+            )
+
+        for card in self.held_cards:
+            card.visible = False
+
+        with self.static_layer.activate() as framebuffer:
+            framebuffer.clear(self.background_color)
+            self.card_mats.draw()
+            self.card_deck.draw()
+
+        for card in self.held_cards:
+            card.visible = True
 
-        for pile_index in range(c.MIDDLE_PILE_1, c.MIDDLE_PILE_7 + 1):
-            for i in range(pile_index - c.MIDDLE_PILE_1 + 1):
-                card = self.card_piles[c.BOTTOM_FACE_DOWN_PILE].pop()
-                self.card_piles[pile_index].append(card)
+        self.static_layer_dirty = False
 
-                fan_offset = c.CARD_VERTICAL_FAN * i
-                card.position = self.card_mats[pile_index].center_x, \
-                                self.card_mats[pile_index].center_y - fan_offset
+    def show_loaded_faces(self):
+        """
+        Adds up to TEXTURE_UPLOADS_PER_FRAME of the card images decoded in the
+        background to the texture atlas, those of face up cards first, and
+        shows the faces of the face up cards among them. Records the time from
+        opening the window until every image is ready.
+        """
+        face_up = [card.image_file_name for card in self.cards if card.is_face_up]
+        loaded = set(registry.collect(self.ctx.default_atlas, c.TEXTURE_UPLOADS_PER_FRAME, face_up))
 
-                self.pull_card_to_top(card)
+        for card in self.cards:
+            if card.is_face_up and card.image_file_name in loaded:
+                card.turn_face_up()
+                self.static_layer_dirty = True
 
-            last_card = self.card_piles[pile_index][-1]
-            last_card.turn_face_up()
+        if not registry.pending:
+            self.profiler.record('faces_ready', time.perf_counter() - self.start_time)
 
+    @profiled('on_draw')
     def on_draw(self):
         """
-        Clear any sprites that are currently rendered and render all sprites in
-        their initial positions.
+        Copies the static layer (re-rendering it first if the piles have
+        changed since it was last rendered) to the screen, then draws the held
+        cards on top, followed by the profiling overlay if it is shown. The
+        time from opening the window to the end of the first frame is recorded
+        as 'first_frame'.
+        """
+        self.profiler.frame()
+
+        if registry.pending:
+            self.show_loaded_faces()
+
+        if self.static_layer_dirty:
+            self.render_static_layer()
+
+        self.ctx.copy_framebuffer(self.static_layer, self.ctx.screen)
+
+        if self.held_cards:
+            self.held_card_list.draw()
+
+        if self.show_profiler:
+            self.draw_profiler()
+
+        if not self.first_frame_drawn:
+            self.first_frame_drawn = True
+            self.profiler.record('first_frame', time.perf_counter() - self.start_time)
+
+    def draw_profiler(self):
+        """
+        Draws the frame rate, the recent timing percentiles of the profiled
+        methods and the winnable deal queue's metrics in the bottom right
+        corner of the window.
         """
-        self.clear()
-        self.card_mats.draw()
-        self.card_deck.draw()
+        if self.profiler_text is None:
+            self.profiler_text = arcade.Text(
+                '',
+                self.width - c.PROFILER_MARGIN,
+                c.PROFILER_MARGIN,
+                arcade.color.BLACK,
+                c.PROFILER_FONT_SIZE,
+                width=c.PROFILER_TEXT_WIDTH,
+                anchor_x='right',
+                anchor_y='bottom',
+                multiline=True
+            )
+
+        lines = self.profiler.summary_lines()
 
+        if self.prefetcher is not None:
+            stats = self.prefetcher.stats()
+            lines.append(
+                f'winnable queue {stats["ready"]}/{self.prefetcher.queue_depth} '
+                f'hit rate {stats["hit_rate"]:.0%} solve {stats["mean_solve_seconds"]:.2f} s'
+            )
+
+        self.profiler_text.text = '\n'.join(lines)
+        self.profiler_text.draw()
+
+    @profiled('on_mouse_press')
     def on_mouse_press(self, x: float, y: float, button: int, key_modifiers: int):
         """
         Registers a clicked card sprite as a held card so that it can be dragged
@@ -386,37 +569,33 @@ class Game(arcade.Window):
         :param button: The mouse button
         :param key_modifiers:
         """
-        clicked_cards = arcade.get_sprites_at_point((x, y), self.card_deck)
+        picked = self.drop_table.pick(x, y, self.engine.piles)
+        if picked is None:
+            return
 
-        if len(clicked_cards) > 0:
-            primary_card = clicked_cards[-1]
-            pile_index = self.get_pile_for_card(primary_card)
-            card_pile = self.card_piles[pile_index]
+        pile_index, card_index = picked
+
+        if card_index is not None:
+            card_pile = self.engine.piles[pile_index]
+            primary_card = self.cards[card_pile[card_index]]
 
             if pile_index == c.BOTTOM_FACE_DOWN_PILE:
-                self.draw_cards_with_skip(card_pile)
-            elif pile_index < c.TOP_PILE_1:
-                if primary_card.is_face_down and len(card_pile) - card_pile.index(primary_card) == 1:
-                    primary_card.turn_face_up()
+                self.draw_cards_with_skip()
+            elif pile_index < self.variant.first_foundation:
+                if primary_card.is_face_down and len(card_pile) - card_index == 1:
+                    self.apply_move(Move(pile_index, pile_index, 1, True))
                 else:
-                    self.held_cards = [primary_card]
-                    self.held_cards_initial_position = [self.held_cards[0].position]
-                    self.pull_card_to_top(self.held_cards[0])
-
-                    card_index = card_pile.index(primary_card)
+                    self.clear_held_cards()
 
-                    for i in range(card_index + 1, len(card_pile)):
-                        card = card_pile[i]
+                    for card_id in self.engine.cards_above(primary_card.card_id):
+                        card = self.cards[card_id]
                         self.held_cards.append(card)
                         self.held_cards_initial_position.append(card.position)
-                        self.pull_card_to_top(card)
-        else:
-            clicked_mats = arcade.get_sprites_at_point((x, y), self.card_mats)
 
-            if len(clicked_mats) > 0:
-                mat = clicked_mats[0]
-                mat_index = self.card_mats.index(mat)
-                self.flip_deck(mat_index)
+                    self.held_card_list.extend(self.held_cards)
+                    self.restack(self.held_cards)
+        else:
+            self.flip_deck(pile_index)
 
     def on_mouse_motion(self, x: float, y: float, dx: float, dy: float):
         """
@@ -431,6 +610,7 @@ class Game(arcade.Window):
             card.center_x += dx
             card.center_y += dy
 
+    @profiled('on_mouse_release')
     def on_mouse_release(self, x: float, y: float, button: int, key_modifiers: int):
         """
         Release any currently held cards.
@@ -441,14 +621,38 @@ class Game(arcade.Window):
         """
         if len(self.held_cards) > 0:
             self.update_card_position()
-
-            self.held_cards = []
+            self.clear_held_cards()
 
     def on_key_press(self, symbol: int, modifiers: int):
         """
-        Restarts the game when the user presses 'R'.
+        Restarts the game when the user presses 'R', undoes or redoes a move
+        when the user presses 'Z' or 'Y' while not holding any cards, and shows
+        or hides the profiling overlay when the user presses F3.
         :param symbol: The key entered by the user
         :param modifiers:
         """
         if symbol == arcade.key.R:
             self.setup()
+        elif symbol == arcade.key.Z and not self.held_cards:
+            self.undo_move()
+        elif symbol == arcade.key.Y and not self.held_cards:
+            self.redo_move()
+        elif symbol == arcade.key.F3:
+            self.show_profiler = not self.show_profiler
+
+    def on_resize(self, width: int, height: int):
+        """
+        Discards the static layer so that it is rendered again at the new size.
+        :param width: The new window width
+        :param height: The new window height
+        """
+        super().on_resize(width, height)
+        self.static_layer = None
+        self.static_layer_dirty = True
+
+    def on_close(self):
+        """
+        Closes the profiler's trace hooks before the window closes.
+        """
+        self.profiler.close()
+        super().on_close()
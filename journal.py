@@ -0,0 +1,77 @@
+from engine import Move
+
+RECORD_SIZE = 4
+
+
+class Journal:
+    """
+    Move history stored as fixed size records of RECORD_SIZE bytes (source
+    pile, target pile, count, flip flag) in a single bytearray, with a cursor
+    separating the moves that can be undone from the moves that can be redone.
+    Recording a move discards any moves that were undone.
+    """
+    def __init__(self):
+        self.records = bytearray()
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.records) // RECORD_SIZE
+
+    def clear(self):
+        """
+        Forget every recorded move.
+        """
+        self.records.clear()
+        self.cursor = 0
+
+    def move_at(self, index):
+        """
+        :param index: The index of the record
+        :return: The Move stored in the record
+        """
+        offset = index * RECORD_SIZE
+        source, target, count, flip = self.records[offset:offset + RECORD_SIZE]
+        return Move(source, target, count, bool(flip))
+
+    def record(self, move):
+        """
+        Append a move after the cursor.
+        :param move: The Move that was applied
+        """
+        del self.records[self.cursor * RECORD_SIZE:]
+        self.records += bytes((move.source, move.target, move.count, move.flip))
+        self.cursor += 1
+
+    def can_undo(self):
+        return self.cursor > 0
+
+    def can_redo(self):
+        return self.cursor < len(self)
+
+    def undo(self):
+        """
+        Step the cursor back over the last applied move.
+        :return: The Move to revert, or None if there is nothing to undo
+        """
+        if not self.can_undo():
+            return None
+
+        self.cursor -= 1
+        return self.move_at(self.cursor)
+
+    def redo(self):
+        """
+        Step the cursor forward over the next undone move.
+        :return: The Move to apply again, or None if there is nothing to redo
+        """
+        if not self.can_redo():
+            return None
+
+        self.cursor += 1
+        return self.move_at(self.cursor - 1)
+
+    def moves(self):
+        """
+        :return: The applied moves, oldest first
+        """
+        return [self.move_at(i) for i in range(self.cursor)]
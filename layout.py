@@ -0,0 +1,123 @@
+import math
+import constants as c
+
+
+class DropTable:
+    """
+    Precomputed drop targets for every pile. Each pile's drop area is the
+    bounding rectangle of its mat and its current top card, stored as flat
+    left/right/bottom/top lists so that resolving a drop is one rectangle test
+    per pile with no allocation.
+    """
+    def __init__(self, mat_positions, fans=None):
+        """
+        :param mat_positions: The (x, y) centre of each pile's mat, in pile
+        index order
+        :param fans: The vertical distance between the cards of each pile, or
+        None if no pile is fanned
+        """
+        self.fans = list(fans) if fans is not None else [0] * len(mat_positions)
+        half_width = c.CARD_MAT_WIDTH / 2
+        half_height = c.CARD_MAT_HEIGHT / 2
+
+        self.mat_x = [x for x, _ in mat_positions]
+        self.mat_y = [y for _, y in mat_positions]
+        self.mat_left = [x - half_width for x in self.mat_x]
+        self.mat_right = [x + half_width for x in self.mat_x]
+        self.mat_bottom = [y - half_height for y in self.mat_y]
+        self.mat_top = [y + half_height for y in self.mat_y]
+
+        self.left = self.mat_left.copy()
+        self.right = self.mat_right.copy()
+        self.bottom = self.mat_bottom.copy()
+        self.top = self.mat_top.copy()
+
+    def set_top_card(self, pile_index, position):
+        """
+        Update a pile's drop area after its top card has changed.
+        :param pile_index: The index of the pile
+        :param position: The (x, y) centre of the pile's top card, or None if
+        the pile is empty
+        """
+        if position is None:
+            self.left[pile_index] = self.mat_left[pile_index]
+            self.right[pile_index] = self.mat_right[pile_index]
+            self.bottom[pile_index] = self.mat_bottom[pile_index]
+            self.top[pile_index] = self.mat_top[pile_index]
+            return
+
+        x, y = position
+        half_width = c.CARD_WIDTH / 2
+        half_height = c.CARD_HEIGHT / 2
+        self.left[pile_index] = min(self.mat_left[pile_index], x - half_width)
+        self.right[pile_index] = max(self.mat_right[pile_index], x + half_width)
+        self.bottom[pile_index] = min(self.mat_bottom[pile_index], y - half_height)
+        self.top[pile_index] = max(self.mat_top[pile_index], y + half_height)
+
+    def resolve(self, x, y):
+        """
+        Find the pile on which a card dropped at the given position lands: of
+        the piles whose drop area the card overlaps, the one whose mat centre
+        is closest to the card.
+        :param x: The dropped card's x-coordinate
+        :param y: The dropped card's y-coordinate
+        :return: The index of the pile, or None if the card touches no pile
+        """
+        card_left = x - c.CARD_WIDTH / 2
+        card_right = x + c.CARD_WIDTH / 2
+        card_bottom = y - c.CARD_HEIGHT / 2
+        card_top = y + c.CARD_HEIGHT / 2
+
+        closest_pile = None
+        closest_distance = 0
+
+        for i in range(len(self.left)):
+            if card_right > self.left[i] and card_left < self.right[i] \
+                    and card_top > self.bottom[i] and card_bottom < self.top[i]:
+                dx = self.mat_x[i] - x
+                dy = self.mat_y[i] - y
+                distance = dx * dx + dy * dy
+
+                if closest_pile is None or distance < closest_distance:
+                    closest_pile = i
+                    closest_distance = distance
+
+        return closest_pile
+
+    def pick(self, x, y, piles):
+        """
+        Find what is drawn at a point: the top card under it, going by the
+        piles' layout rather than by testing every card sprite, or else an
+        empty spot of a mat. Later piles are drawn over earlier ones.
+        :param x: The point's x-coordinate
+        :param y: The point's y-coordinate
+        :param piles: The card lists of the piles, in pile index order
+        :return: The pile index and the position of the card in the pile, the
+        pile index and None for a mat, or None if there is nothing there
+        """
+        half_width = c.CARD_WIDTH / 2
+        half_height = c.CARD_HEIGHT / 2
+        mat = None
+
+        for i in range(len(self.left) - 1, -1, -1):
+            if not (self.left[i] <= x <= self.right[i] and self.bottom[i] <= y <= self.top[i]):
+                continue
+
+            length = len(piles[i])
+            if length and abs(x - self.mat_x[i]) <= half_width:
+                fan = self.fans[i]
+                offset = self.mat_y[i] - y
+
+                if fan:
+                    position = min(length - 1, math.floor((offset + half_height) / fan))
+                else:
+                    position = length - 1
+
+                if position >= 0 and abs(offset - fan * position) <= half_height:
+                    return i, position
+
+            if mat is None and self.mat_left[i] <= x <= self.mat_right[i] \
+                    and self.mat_bottom[i] <= y <= self.mat_top[i]:
+                mat = i
+
+        return None if mat is None else (mat, None)
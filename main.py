@@ -1,12 +1,62 @@
+import argparse
 import arcade
+import constants as c
 from game import Game
+from prefetch import DealPrefetcher
+from profiler import JsonlTraceHook
+from variants import KLONDIKE, VARIANTS
 
 
 def main():
-    game_window = Game()
-    game_window.setup()
+    parser = argparse.ArgumentParser(description='Klondike solitaire.')
+    parser.add_argument('--variant', choices=VARIANTS, default=KLONDIKE.name,
+                        help='the rules to play by (default: %(default)s)')
+    parser.add_argument('--deal', type=int, default=None,
+                        help='number of the deal to play (default: a random deal)')
+    parser.add_argument('--record', metavar='DIRECTORY', default=None,
+                        help='record a replay of every game in this directory')
+    parser.add_argument('--replay', metavar='FILE', default=None,
+                        help='resume play from a replay file')
+    parser.add_argument('--replay-events', type=int, default=None,
+                        help='number of replay events to play before resuming')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='append every profiled timing to this JSON Lines file')
+    parser.add_argument('--profile', action='store_true',
+                        help='show the profiling overlay (toggle with F3)')
+    parser.add_argument('--winnable', action='store_true',
+                        help='only deal random deals that the solver has proven winnable')
+    parser.add_argument('--queue-depth', type=int, default=c.WINNABLE_QUEUE_DEPTH,
+                        help='winnable deals to keep ready')
+    parser.add_argument('--solve-timeout', type=float, default=c.WINNABLE_SOLVE_TIMEOUT,
+                        help='seconds the solver may spend on a candidate deal')
+    args = parser.parse_args()
+
+    variant = VARIANTS[args.variant]
+    if variant is not KLONDIKE and (args.record is not None or args.replay is not None):
+        parser.error('replays can only be recorded and played for klondike')
+    if args.winnable and variant is not KLONDIKE:
+        parser.error('--winnable is only supported for klondike')
+
+    prefetcher = None
+    if args.winnable:
+        prefetcher = DealPrefetcher(args.queue_depth, args.solve_timeout)
+
+    game_window = Game(args.record, prefetcher, variant)
+    game_window.show_profiler = args.profile
+
+    if args.trace is not None:
+        game_window.profiler.hooks.append(JsonlTraceHook(args.trace))
+
+    if args.replay is not None:
+        game_window.load_replay(args.replay, args.replay_events)
+    else:
+        game_window.setup(args.deal)
+
     arcade.run()
 
+    if prefetcher is not None:
+        prefetcher.close()
+
 
 if __name__ == '__main__':
     main()
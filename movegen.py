@@ -0,0 +1,201 @@
+"""
+Incremental legal move generation. Instead of checking every movable card
+against every pile, each target pile keeps the few cards that could be
+played on it (worked out from its top card), and the moves onto a target are
+found by looking those cards up in the engine's card index. A move only
+changes the top cards and movable runs of its own piles, so only the targets
+of those piles, and the targets waiting for cards in them, are recomputed.
+"""
+import constants as c
+from engine import Move
+from variants import RUN_LENGTH
+
+
+class MoveGenerator:
+    """
+    Keeps the legal moves of an Engine up to date as moves are applied and
+    undone. For each pile it caches the position of the lowest card that can
+    be picked up (run_start) and, for each target pile, the cards that could
+    be played on it (wanted) and the moves that play them (moves_to).
+
+    The generator must be told about every change to the engine: use its
+    apply and undo methods, or call update after applying or undoing a move
+    directly, and call refresh after Engine.deal or Engine.set_state.
+    """
+    def __init__(self, engine):
+        """
+        :param engine: The game Engine to follow
+        """
+        self.engine = engine
+        self.variant = engine.variant
+        self.targets = range(c.MIDDLE_PILE_1, engine.pile_count)
+        self.run_start = [0] * engine.pile_count
+        self.wanted = [()] * engine.pile_count
+        self.moves_to = [[] for _ in range(engine.pile_count)]
+        self.moves = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Rebuild every cached pile and target from the engine's state.
+        """
+        for pile_index in range(self.engine.pile_count):
+            self.update_run(pile_index)
+
+        for target in self.targets:
+            self.update_wanted(target)
+            self.update_target(target)
+
+        self.moves = None
+
+    def update_run(self, pile_index):
+        """
+        Cache the position of the lowest card that can be picked up from a
+        pile: the bottom of its face up run (in Spider, of its top run of one
+        suit), or only the top card for the bottom face up pile. Cards cannot
+        be picked up from the other piles.
+        :param pile_index: The index of the pile
+        """
+        engine = self.engine
+        pile = engine.piles[pile_index]
+        position = len(pile)
+
+        if c.BOTTOM_FACE_UP_PILE <= pile_index < engine.first_foundation:
+            face_up = engine.face_up
+            lowest = max(len(pile) - 1, 0) if pile_index == c.BOTTOM_FACE_UP_PILE else 0
+
+            while position > lowest and face_up[pile[position - 1]]:
+                if engine.spider and position < len(pile):
+                    card = pile[position - 1]
+                    above = pile[position]
+                    if engine.suits[card] != engine.suits[above] \
+                            or engine.ranks[card] != engine.ranks[above] + 1:
+                        break
+
+                position -= 1
+
+        self.run_start[pile_index] = position
+
+    def update_wanted(self, target):
+        """
+        Cache the cards that could be played on a target pile given its top
+        card.
+        :param target: The index of a middle or top pile
+        """
+        pile = self.engine.piles[target]
+        variant = self.variant
+
+        if target >= variant.first_foundation:
+            if pile:
+                self.wanted[target] = variant.foundation_children[pile[-1]]
+            else:
+                self.wanted[target] = variant.kings if variant.spider else variant.aces
+        elif pile:
+            self.wanted[target] = variant.stackable_on[pile[-1]]
+        else:
+            self.wanted[target] = range(variant.card_count) if variant.spider else variant.kings
+
+    def update_target(self, target):
+        """
+        Find the moves that play one of a target's wanted cards, with the
+        cards stacked on it, onto the target.
+        :param target: The index of a middle or top pile
+        """
+        engine = self.engine
+        moves = []
+
+        first_foundation = engine.first_foundation
+        foundation_count = RUN_LENGTH if engine.spider else 1
+
+        for card in self.wanted[target]:
+            source = engine.pile_of[card]
+            if source == target or not c.BOTTOM_FACE_UP_PILE <= source < first_foundation:
+                continue
+
+            position = engine.position_of[card]
+            if position < self.run_start[source]:
+                continue
+
+            count = len(engine.piles[source]) - position
+            if count == foundation_count or target < first_foundation:
+                moves.append(Move(source, target, count, False))
+
+        self.moves_to[target] = moves
+
+    def update(self, move):
+        """
+        Update the cache after a move has been applied to or undone on the
+        engine.
+        :param move: The Move that was applied or undone
+        """
+        source, target = move.source, move.target
+
+        if source == target == c.BOTTOM_FACE_DOWN_PILE:
+            # A Spider deal adds a card to every column
+            self.refresh()
+            return
+
+        for pile_index in (source, target):
+            self.update_run(pile_index)
+            if pile_index >= c.MIDDLE_PILE_1:
+                self.update_wanted(pile_index)
+
+        pile_of = self.engine.pile_of
+        for pile_index in self.targets:
+            if pile_index == source or pile_index == target:
+                self.update_target(pile_index)
+                continue
+
+            for card in self.wanted[pile_index]:
+                card_pile = pile_of[card]
+                if card_pile == source or card_pile == target:
+                    self.update_target(pile_index)
+                    break
+
+        self.moves = None
+
+    def apply(self, move):
+        """
+        Apply a move to the engine and update the cache.
+        :param move: The Move to apply
+        """
+        self.engine.apply(move)
+        self.update(move)
+
+    def undo(self, move):
+        """
+        Revert the last move applied to the engine and update the cache.
+        :param move: The Move to revert
+        """
+        self.engine.undo(move)
+        self.update(move)
+
+    def legal_moves(self):
+        """
+        List every move that can be applied to the current state, in the same
+        order as Engine.legal_moves. The list is cached until the next update,
+        and must not be modified.
+        :return: A list of Moves
+        """
+        if self.moves is not None:
+            return self.moves
+
+        engine = self.engine
+        moves = []
+        stock_move = engine.stock_move()
+        if stock_move is not None:
+            moves.append(stock_move)
+
+        others = []
+        for source in range(c.BOTTOM_FACE_UP_PILE, engine.first_foundation):
+            pile = engine.piles[source]
+            if pile and not engine.face_up[pile[-1]]:
+                others.append(Move(source, source, 1, True))
+
+        for target in self.targets:
+            others.extend(self.moves_to[target])
+
+        others.sort(key=lambda move: (move.source, move.count, move.target))
+        moves.extend(others)
+        self.moves = moves
+        return moves
@@ -0,0 +1,115 @@
+"""
+Compact, immutable snapshots of the engine state.
+
+A snapshot is PACKED_SIZE (65) bytes: the length of each of the 13 piles,
+followed by every card from the bottom of pile 0 to the top of pile 12, one
+byte per card holding the 6 bit card id and, in bit 6, whether the card is face
+up. Snapshots are plain bytes, so they can be hashed, compared and stored in
+sets or dicts directly.
+"""
+import constants as c
+from engine import Engine
+
+FACE_UP_BIT = 0x40
+CARD_MASK = 0x3F
+PACKED_SIZE = c.PILE_COUNT + c.CARD_COUNT
+
+
+def check_packable(engine):
+    """
+    Check that an engine's state fits the snapshot layout.
+    :param engine: The game Engine
+    :raises ValueError: If the engine is not playing a single deck variant with
+    PILE_COUNT piles
+    """
+    if engine.card_count != c.CARD_COUNT or engine.pile_count != c.PILE_COUNT:
+        raise ValueError(f'Cannot pack a {engine.variant.title} game state')
+
+
+def pack(engine):
+    """
+    Encode an engine's state.
+    :param engine: The game Engine
+    :return: The snapshot bytes
+    :raises ValueError: If the engine is not playing a single deck variant with
+    PILE_COUNT piles
+    """
+    check_packable(engine)
+
+    data = bytearray(PACKED_SIZE)
+    face_up = engine.face_up
+    i = c.PILE_COUNT
+
+    for pile_index, pile in enumerate(engine.piles):
+        data[pile_index] = len(pile)
+        for card in pile:
+            data[i] = card | FACE_UP_BIT if face_up[card] else card
+            i += 1
+
+    return bytes(data)
+
+
+def check_faces(pile_index, pile, face_up):
+    """
+    Check that the cards of a pile are face up or down as play leaves them: the
+    stock face down, the waste and the top piles face up, and the middle piles
+    face down below their face up cards.
+    :param pile_index: The index of the pile
+    :param pile: The card ids of the pile, ordered bottom to top
+    :param face_up: A face up flag for each card id
+    :raises ValueError: If a card is face up or down where it cannot be
+    """
+    flags = [face_up[card] for card in pile]
+
+    if pile_index == c.BOTTOM_FACE_DOWN_PILE:
+        valid = not any(flags)
+    elif c.MIDDLE_PILE_1 <= pile_index <= c.MIDDLE_PILE_7:
+        valid = flags == sorted(flags)
+    else:
+        valid = all(flags)
+
+    if not valid:
+        raise ValueError('Not a packed game state')
+
+
+def unpack(data, engine=None):
+    """
+    Decode a snapshot into an engine.
+    :param data: The snapshot bytes
+    :param engine: The Engine to load the state into, or None to create one
+    :return: The Engine
+    :raises ValueError: If the snapshot is not PACKED_SIZE bytes long, its
+    pile lengths do not add up to the number of cards, it does not hold every
+    card exactly once, a card is face up or down where play cannot leave it, or
+    if the engine is not playing a single deck variant with PILE_COUNT piles
+    """
+    if len(data) != PACKED_SIZE or sum(data[:c.PILE_COUNT]) != c.CARD_COUNT:
+        raise ValueError('Not a packed game state')
+
+    if engine is not None:
+        check_packable(engine)
+
+    piles = []
+    face_up = bytearray(c.CARD_COUNT)
+    seen = bytearray(c.CARD_COUNT)
+    i = c.PILE_COUNT
+
+    for pile_index, length in enumerate(data[:c.PILE_COUNT]):
+        pile = []
+        for value in data[i:i + length]:
+            card = value & CARD_MASK
+            if value & ~(CARD_MASK | FACE_UP_BIT) or card >= c.CARD_COUNT or seen[card]:
+                raise ValueError('Not a packed game state')
+            seen[card] = 1
+            face_up[card] = value >> 6
+            pile.append(card)
+
+        check_faces(pile_index, pile, face_up)
+        piles.append(pile)
+        i += length
+
+    if engine is None:
+        engine = Engine()
+
+    engine.set_state(piles, face_up)
+    return engine
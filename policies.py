@@ -0,0 +1,184 @@
+import constants as c
+
+
+def is_stock_move(move):
+    """
+    :param move: An engine Move
+    :return: True if the move draws from the stock or recycles the waste pile
+    """
+    return move.flip and move.source != move.target
+
+
+def plays_to_top(engine, card):
+    """
+    :param engine: The game Engine
+    :param card: A card id
+    :return: True if the card could be played on one of the top piles
+    """
+    return any(
+        engine.can_play_to_top(card, 1, pile_index)
+        for pile_index in range(c.TOP_PILE_1, c.TOP_PILE_4 + 1)
+    )
+
+
+def useful_moves(engine):
+    """
+    The legal moves, without the middle-to-middle moves that cannot make
+    progress: moving a whole pile to an empty pile, or moving a stack off a
+    face up card that could not then be played to a top pile.
+    :param engine: The game Engine
+    :return: A list of Moves
+    """
+    moves = []
+
+    for move in engine.legal_moves():
+        source, target, count, flip = move
+
+        if not flip and c.MIDDLE_PILE_1 <= source <= c.MIDDLE_PILE_7 \
+                and c.MIDDLE_PILE_1 <= target <= c.MIDDLE_PILE_7:
+            pile = engine.piles[source]
+            base = len(pile) - count
+
+            if base == 0:
+                if not engine.piles[target]:
+                    continue
+            else:
+                below = pile[base - 1]
+                if engine.face_up[below] and not plays_to_top(engine, below):
+                    continue
+
+        moves.append(move)
+
+    return moves
+
+
+def uncovers(engine, move):
+    """
+    :param engine: The game Engine
+    :param move: A middle-to-middle or middle-to-top Move
+    :return: True if the move leaves a face down card on top of its pile or
+    empties the pile
+    """
+    pile = engine.piles[move.source]
+    base = len(pile) - move.count
+    return base == 0 or not engine.face_up[pile[base - 1]]
+
+
+class GreedyPolicy:
+    """
+    Always plays the first move of the highest priority kind: turning a card
+    over, playing to a top pile, uncovering a card, playing from the bottom
+    face up pile, any other move, then drawing or recycling the stock.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+
+    def rank(self, engine, move):
+        """
+        :param engine: The game Engine
+        :param move: A legal Move
+        :return: The priority of the move, lower is better
+        """
+        if move.source == move.target:
+            return 0
+        elif is_stock_move(move):
+            return 5
+        elif move.target >= c.TOP_PILE_1:
+            return 1
+        elif move.source == c.BOTTOM_FACE_UP_PILE:
+            return 3
+        elif uncovers(engine, move):
+            return 2
+
+        return 4
+
+    def choose(self, engine, moves):
+        """
+        :param engine: The game Engine
+        :param moves: The candidate Moves
+        :return: The chosen Move
+        """
+        return min(moves, key=lambda move: self.rank(engine, move))
+
+
+class RandomPolicy:
+    """
+    Plays a uniformly random move.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+
+    def choose(self, engine, moves):
+        """
+        :param engine: The game Engine
+        :param moves: The candidate Moves
+        :return: The chosen Move
+        """
+        return self.rng.choice(moves)
+
+
+class HeuristicPolicy:
+    """
+    Scores every move with a weighted sum of features and plays the best one,
+    breaking ties at random.
+    """
+    WEIGHTS = {
+        'reveal': 100,
+        'to_top': 40,
+        'uncover': 30,
+        'face_down_below': 5,
+        'from_waste': 20,
+        'to_empty': -10,
+        'stock': -50,
+    }
+
+    def __init__(self, rng, weights=None):
+        self.rng = rng
+        self.weights = weights or self.WEIGHTS
+
+    def score(self, engine, move):
+        """
+        :param engine: The game Engine
+        :param move: A legal Move
+        :return: The weighted score of the move, higher is better
+        """
+        weights = self.weights
+        source, target, count, flip = move
+
+        if source == target:
+            return weights['reveal']
+        elif is_stock_move(move):
+            return weights['stock']
+
+        score = 0
+        if target >= c.TOP_PILE_1:
+            score += weights['to_top']
+        if source == c.BOTTOM_FACE_UP_PILE:
+            score += weights['from_waste']
+        elif uncovers(engine, move):
+            score += weights['uncover']
+        if not engine.piles[target]:
+            score += weights['to_empty']
+
+        pile = engine.piles[source]
+        face_down = sum(1 for card in pile[:len(pile) - count] if not engine.face_up[card])
+        score += weights['face_down_below'] * face_down
+
+        return score
+
+    def choose(self, engine, moves):
+        """
+        :param engine: The game Engine
+        :param moves: The candidate Moves
+        :return: The chosen Move
+        """
+        scores = [self.score(engine, move) for move in moves]
+        best = max(scores)
+        return self.rng.choice([move for move, score in zip(moves, scores) if score == best])
+
+
+POLICIES = {
+    'greedy': GreedyPolicy,
+    'random': RandomPolicy,
+    'heuristic': HeuristicPolicy,
+}
@@ -0,0 +1,177 @@
+"""
+Background search for winnable deals. A process pool deals random numbered
+deals and runs the solver on them while the game is being played, keeping a
+queue of deals proven winnable ready for the next restart.
+"""
+import multiprocessing
+import random
+import threading
+from collections import deque
+import constants as c
+from deals import deal_permutation, random_deal_number
+from engine import Engine
+from solver import WON, Solver
+
+
+def verify_deal(deal_number, max_nodes, time_limit):
+    """
+    Solve a numbered deal from its starting position.
+    :param deal_number: The deal number
+    :param max_nodes: The solver's node budget
+    :param time_limit: The solver's time limit in seconds
+    :return: The deal number, the solver's status and the seconds taken
+    """
+    engine = Engine()
+    engine.deal(deal_permutation(deal_number))
+    result = Solver(max_nodes, time_limit).solve(engine)
+    return deal_number, result.status, result.seconds
+
+
+class DealPrefetcher:
+    """
+    Keeps up to queue_depth winnable deal numbers ready. Candidates are
+    solved on a process pool; deals that are lost or that the solver cannot
+    decide within its budget are discarded, so every queued deal has a known
+    solution. pop never waits for the solver: when the queue is empty, it
+    deals again one of the deals already known to be winnable, either from
+    known_deals or verified earlier in the session. Fallback deals are drawn
+    without replacement, so none is repeated until all of them have been
+    dealt.
+
+    The pool is started when the prefetcher is created, which should be
+    before the game window opens so that the workers do not inherit it.
+    """
+    def __init__(self, queue_depth=c.WINNABLE_QUEUE_DEPTH, time_limit=c.WINNABLE_SOLVE_TIMEOUT,
+                 max_nodes=c.WINNABLE_SOLVE_NODES, processes=c.WINNABLE_PROCESSES, rng=None,
+                 known_deals=c.WINNABLE_KNOWN_DEALS):
+        """
+        :param queue_depth: The number of verified deals to keep ready
+        :param time_limit: The seconds the solver may spend on one deal
+        :param max_nodes: The solver's node budget for one deal
+        :param processes: The number of solver processes
+        :param rng: The random.Random used to pick candidate and fallback deals
+        :param known_deals: Deal numbers already proven winnable, to fall back
+        on when the queue is empty (must not be empty)
+        """
+        self.queue_depth = queue_depth
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.rng = rng or random.Random()
+        self.ready = deque()
+        self.known = list(known_deals)
+        self.fallback = []
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.verified = 0
+        self.rejected = 0
+        self.solve_seconds = 0.0
+
+        self.pool = multiprocessing.Pool(processes)
+        self.fill()
+
+    def fill(self):
+        """
+        Submit enough candidate deals to the pool to bring the ready and
+        pending deals up to the queue depth.
+        """
+        with self.lock:
+            if self.closed:
+                return
+
+            wanted = self.queue_depth - len(self.ready) - self.pending
+            self.pending += max(wanted, 0)
+
+        for _ in range(wanted):
+            self.pool.apply_async(
+                verify_deal,
+                (random_deal_number(self.rng), self.max_nodes, self.time_limit),
+                callback=self.on_solved,
+                error_callback=self.on_error
+            )
+
+    def on_solved(self, result):
+        """
+        Queue a solved candidate if it is winnable and submit a replacement.
+        Runs on the pool's result thread.
+        :param result: The return value of verify_deal
+        """
+        deal_number, status, seconds = result
+
+        with self.lock:
+            self.pending -= 1
+            self.solve_seconds += seconds
+
+            if status == WON:
+                self.verified += 1
+                self.ready.append(deal_number)
+                self.known.append(deal_number)
+            else:
+                self.rejected += 1
+
+        self.fill()
+
+    def on_error(self, error):
+        with self.lock:
+            self.pending -= 1
+            self.rejected += 1
+
+        self.fill()
+
+    def pop(self):
+        """
+        Take the next verified deal, without waiting. If none is ready yet,
+        counts a miss and returns one of the known winnable deals instead.
+        :return: A winnable deal number
+        """
+        with self.lock:
+            if self.ready:
+                self.hits += 1
+                deal_number = self.ready.popleft()
+            else:
+                self.misses += 1
+                if not self.fallback:
+                    self.fallback = list(self.known)
+                    self.rng.shuffle(self.fallback)
+                deal_number = self.fallback.pop()
+
+        self.fill()
+        return deal_number
+
+    @property
+    def hit_rate(self):
+        """
+        :return: The fraction of pops that found a new verified deal ready
+        """
+        pops = self.hits + self.misses
+        return self.hits / pops if pops else 0.0
+
+    def stats(self):
+        """
+        :return: A dict of the queue's current size and its metrics
+        """
+        with self.lock:
+            solved = self.verified + self.rejected
+            return {
+                'ready': len(self.ready),
+                'pending': self.pending,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate,
+                'verified': self.verified,
+                'rejected': self.rejected,
+                'mean_solve_seconds': self.solve_seconds / solved if solved else 0.0,
+            }
+
+    def close(self):
+        """
+        Stop the solver processes, abandoning any pending candidates.
+        """
+        with self.lock:
+            self.closed = True
+
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,135 @@
+import functools
+import json
+import time
+from collections import deque
+import constants as c
+
+
+class Profiler:
+    """
+    Keeps the most recent timings of each named event (frames, input handlers,
+    setup) and passes every timing to its hooks. A hook is any callable taking
+    the event name and its duration in seconds.
+    """
+    def __init__(self, window_size=c.PROFILER_WINDOW_SIZE):
+        """
+        :param window_size: The number of recent timings kept per event
+        """
+        self.window_size = window_size
+        self.samples = {}
+        self.hooks = []
+        self.last_frame_start = None
+
+    def record(self, name, seconds):
+        """
+        Store a timing and pass it to the hooks.
+        :param name: The event name
+        :param seconds: The event's duration
+        """
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window_size)
+
+        samples.append(seconds)
+
+        for hook in self.hooks:
+            hook(name, seconds)
+
+    def frame(self):
+        """
+        Mark the start of a frame, recording the time since the previous one
+        as a 'frame' timing.
+        """
+        now = time.perf_counter()
+
+        if self.last_frame_start is not None:
+            self.record('frame', now - self.last_frame_start)
+
+        self.last_frame_start = now
+
+    def percentile(self, name, percent):
+        """
+        :param name: The event name
+        :param percent: The percentile, from 0 to 100
+        :return: The percentile of the recent timings in seconds, or None if
+        there are none
+        """
+        samples = self.samples.get(name)
+        if not samples:
+            return None
+
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def fps(self):
+        """
+        :return: The mean frame rate over the recent frames, or 0 if there are
+        none
+        """
+        frames = self.samples.get('frame')
+        if not frames:
+            return 0.0
+
+        return len(frames) / sum(frames)
+
+    def summary_lines(self):
+        """
+        :return: One line of text for the frame rate and one per event with its
+        50th, 95th and 99th percentile timings in milliseconds
+        """
+        lines = [f'FPS {self.fps():.1f}']
+
+        for name in self.samples:
+            p50, p95, p99 = (self.percentile(name, p) * 1000 for p in (50, 95, 99))
+            lines.append(f'{name}: p50 {p50:.2f} p95 {p95:.2f} p99 {p99:.2f} ms')
+
+        return lines
+
+    def close(self):
+        """
+        Close the hooks that hold resources, such as trace files.
+        """
+        for hook in self.hooks:
+            close = getattr(hook, 'close', None)
+            if close is not None:
+                close()
+
+
+def profiled(name):
+    """
+    Decorator recording the duration of every call of a method in the profiler
+    held by the method's object.
+    :param name: The event name to record the calls under
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.profiler.record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class JsonlTraceHook:
+    """
+    Profiler hook appending every timing to a JSON Lines file as
+    {"time": <unix time>, "event": <name>, "ms": <duration>}. The file is line
+    buffered, so every timing is written out as soon as it is recorded.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'a', buffering=1)
+
+    def __call__(self, name, seconds):
+        record = {'time': time.time(), 'event': name, 'ms': seconds * 1000}
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        """
+        Close the trace file.
+        """
+        self.file.close()
@@ -0,0 +1,202 @@
+"""
+Binary replay files.
+
+A replay is the MAGIC header, the deal number as a varint, then one varint
+per event: UNDO_CODE or REDO_CODE for an undo or a redo, or a move encoded by
+encode_move. Varints are unsigned LEB128: 7 bits per byte, low bits first,
+with the high bit set on every byte but the last. A typical move takes two
+bytes.
+"""
+from deals import deal_permutation
+from engine import Engine, Move
+from journal import Journal
+
+MAGIC = b'KLR1'
+UNDO = 'undo'
+REDO = 'redo'
+UNDO_CODE = 0
+REDO_CODE = 1
+MOVE_CODE_OFFSET = 2
+
+
+def write_varint(file, value):
+    """
+    Write an unsigned integer as a varint.
+    :param file: A binary file object
+    :param value: The integer
+    """
+    data = bytearray()
+    while value > 0x7F:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    file.write(data)
+
+
+def read_varint(data, offset):
+    """
+    Read a varint.
+    :param data: A bytes-like object
+    :param offset: The offset of the varint's first byte
+    :return: The integer and the offset after the varint
+    :raises ValueError: If the data ends in the middle of the varint
+    """
+    value = 0
+    shift = 0
+
+    while True:
+        if offset >= len(data):
+            raise ValueError('Truncated replay')
+
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+
+        if byte < 0x80:
+            return value, offset
+
+        shift += 7
+
+
+def encode_move(move):
+    """
+    :param move: An engine Move
+    :return: The move's event code
+    """
+    source, target, count, flip = move
+    return (((source << 4 | target) << 6 | count) << 1 | flip) + MOVE_CODE_OFFSET
+
+
+def decode_move(code):
+    """
+    :param code: An event code from encode_move
+    :return: The engine Move
+    """
+    code -= MOVE_CODE_OFFSET
+    return Move(code >> 11, code >> 7 & 0xF, code >> 1 & 0x3F, bool(code & 1))
+
+
+class ReplayWriter:
+    """
+    Streams a game's events to a replay file as they happen. Each event is
+    flushed as soon as it is written, so a replay survives a crash.
+    """
+    def __init__(self, path, deal_number):
+        """
+        :param path: The file to create
+        :param deal_number: The number of the game's deal
+        :raises FileExistsError: If the file already exists
+        """
+        self.file = open(path, 'xb')
+        self.file.write(MAGIC)
+        write_varint(self.file, deal_number)
+        self.file.flush()
+
+    def write_code(self, code):
+        write_varint(self.file, code)
+        self.file.flush()
+
+    def write_move(self, move):
+        self.write_code(encode_move(move))
+
+    def write_undo(self):
+        self.write_code(UNDO_CODE)
+
+    def write_redo(self):
+        self.write_code(REDO_CODE)
+
+    def write_event(self, event):
+        """
+        :param event: A Move, UNDO or REDO
+        """
+        if event == UNDO:
+            self.write_undo()
+        elif event == REDO:
+            self.write_redo()
+        else:
+            self.write_move(event)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_header(data):
+    """
+    :param data: The contents of a replay file
+    :return: The deal number and the offset of the first event
+    :raises ValueError: If the data is not a replay
+    """
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError('Not a replay file')
+
+    return read_varint(data, len(MAGIC))
+
+
+def iter_events(data, offset):
+    """
+    Decode the events of a replay lazily.
+    :param data: The contents of a replay file
+    :param offset: The offset of the first event, from read_header
+    :return: A generator of Moves, UNDO and REDO
+    """
+    while offset < len(data):
+        code, offset = read_varint(data, offset)
+
+        if code == UNDO_CODE:
+            yield UNDO
+        elif code == REDO_CODE:
+            yield REDO
+        else:
+            yield decode_move(code)
+
+
+def apply_event(engine, journal, event):
+    """
+    Play one replay event through the rules engine.
+    :param engine: The game Engine
+    :param journal: The game's Journal, used to resolve undo and redo
+    :param event: A Move, UNDO or REDO
+    :raises ValueError: If the event is a move that is not legal in the
+    current state
+    """
+    if event == UNDO:
+        move = journal.undo()
+        if move is not None:
+            engine.undo(move)
+    elif event == REDO:
+        move = journal.redo()
+        if move is not None:
+            engine.apply(move)
+    else:
+        if not engine.is_legal(event):
+            raise ValueError(f'Illegal move in replay: {event}')
+
+        engine.apply(event)
+        journal.record(event)
+
+
+def fast_forward(data, event_count=None):
+    """
+    Rebuild the game state after the first event_count events of a replay
+    without rendering anything.
+    :param data: The contents of a replay file
+    :param event_count: The number of events to play, or None for all of them
+    :return: The deal number, the Engine and the Journal after those events
+    """
+    deal_number, offset = read_header(data)
+    engine = Engine()
+    engine.deal(deal_permutation(deal_number))
+    journal = Journal()
+
+    for i, event in enumerate(iter_events(data, offset)):
+        if event_count is not None and i >= event_count:
+            break
+        apply_event(engine, journal, event)
+
+    return deal_number, engine, journal
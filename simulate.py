@@ -0,0 +1,131 @@
+"""
+Monte Carlo win-rate simulator. Plays numbered deals with an automatic policy
+across a process pool and streams one result per deal to a CSV or JSONL file.
+
+Example: python simulate.py --deals 100000 --policy greedy --output results.csv
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import random
+import sys
+import time
+from functools import partial
+import constants as c
+from deals import deal_permutation
+from engine import Engine
+from policies import POLICIES, is_stock_move, useful_moves
+
+RESULT_FIELDS = ['seed', 'won', 'moves', 'stock_passes', 'seconds']
+
+
+def play_deal(seed, policy_name, max_moves):
+    """
+    Deal and play one game until it is won, the policy runs out of moves, a
+    whole pass through the stock makes no progress, or max_moves is reached.
+    :param seed: The deal number, which also seeds the policy's random
+    generator
+    :param policy_name: The name of the policy in POLICIES
+    :param max_moves: The maximum number of moves to play
+    :return: A dict with the RESULT_FIELDS of the game
+    """
+    start = time.perf_counter()
+    engine = Engine()
+    engine.deal(deal_permutation(seed))
+    policy = POLICIES[policy_name](random.Random(seed))
+
+    moves = 0
+    stock_passes = 0
+    progress = True
+
+    while moves < max_moves and not engine.is_won():
+        candidates = useful_moves(engine)
+        if not candidates:
+            break
+
+        move = policy.choose(engine, candidates)
+
+        if move.source == c.BOTTOM_FACE_UP_PILE and is_stock_move(move):
+            if not progress:
+                break
+            stock_passes += 1
+            progress = False
+        elif not is_stock_move(move):
+            progress = True
+
+        engine.apply(move)
+        moves += 1
+
+    return {
+        'seed': seed,
+        'won': engine.is_won(),
+        'moves': moves,
+        'stock_passes': stock_passes,
+        'seconds': round(time.perf_counter() - start, 6),
+    }
+
+
+class ResultWriter:
+    """
+    Writes deal results one line at a time as CSV, or as JSONL if the file
+    name ends in .jsonl.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.jsonl = getattr(file, 'name', '').endswith('.jsonl')
+
+        if not self.jsonl:
+            self.csv_writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, result):
+        """
+        :param result: A dict returned by play_deal
+        """
+        if self.jsonl:
+            self.file.write(json.dumps(result) + '\n')
+        else:
+            self.csv_writer.writerow(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate win rates by playing numbered deals.')
+    parser.add_argument('--deals', type=int, default=1000, help='number of deals to play')
+    parser.add_argument('--start-seed', type=int, default=0, help='number of the first deal')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    parser.add_argument('--max-moves', type=int, default=1000, help='move limit per deal')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--chunksize', type=int, default=64,
+                        help='deals handed to a worker at a time')
+    parser.add_argument('--output', default=None,
+                        help='CSV or .jsonl file for per-deal results (default: stdout)')
+    args = parser.parse_args()
+
+    play = partial(play_deal, policy_name=args.policy, max_moves=args.max_moves)
+    seeds = range(args.start_seed, args.start_seed + args.deals)
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    writer = ResultWriter(output)
+
+    wins = 0
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(args.processes) as pool:
+        for result in pool.imap_unordered(play, seeds, chunksize=args.chunksize):
+            writer.write(result)
+            wins += result['won']
+
+    elapsed = time.perf_counter() - start
+    if output is not sys.stdout:
+        output.close()
+
+    print(
+        f'{args.deals} deals, {wins} won ({wins / max(args.deals, 1):.2%}), '
+        f'{args.deals / elapsed:.0f} deals/s',
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
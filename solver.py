@@ -0,0 +1,340 @@
+"""
+Exhaustive Klondike solver: depth-first search over the engine's legal moves
+with a Zobrist-hashed, LRU-bounded transposition table.
+
+Example: python solver.py --seeds 0 100 --max-nodes 200000
+"""
+import argparse
+import random
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+import constants as c
+from deals import deal_permutation
+from engine import Engine, card_rank, is_red
+from policies import GreedyPolicy
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MAX_PILE_LENGTH = c.CARD_COUNT
+WON = 'won'
+LOST = 'lost'
+UNKNOWN = 'unknown'
+HASH_MASK = (1 << 64) - 1
+
+
+class SolveResult(NamedTuple):
+    """
+    The outcome of a search.
+    status: WON if the deal can be won, LOST if every reachable state was
+    explored without a win, UNKNOWN if the node or time budget ran out
+    moves: The winning moves from the searched state, or None
+    nodes: The number of states visited
+    seconds: The wall time of the search
+    peak_table_entries: The largest size the transposition table reached
+    peak_rss_kb: The peak resident memory of the process, or None if it is
+    not available on this platform
+    """
+    status: str
+    moves: Optional[List]
+    nodes: int
+    seconds: float
+    peak_table_entries: int
+    peak_rss_kb: Optional[int]
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+
+class ZobristKeys:
+    """
+    Random 64 bit keys for every (card, location) pair. The keys of the cards
+    in each middle pile are XORed into one hash of that pile as a sequence,
+    and the state hash is the sum, modulo 2 ** 64, of the middle pile hashes
+    and the keys of every other card. The sum does not depend on the order of
+    the middle piles, and top pile keys do not depend on the top pile or
+    position, so states that only differ by the order of those piles hash the
+    same and are explored once.
+    """
+    def __init__(self, seed=0):
+        rng = random.Random(seed)
+        size = c.CARD_COUNT * MAX_PILE_LENGTH
+        self.middle = [rng.getrandbits(64) for _ in range(size * 2)]
+        self.top = [rng.getrandbits(64) for _ in range(c.CARD_COUNT)]
+        self.stock = [rng.getrandbits(64) for _ in range(size)]
+        self.waste = [rng.getrandbits(64) for _ in range(size)]
+
+    def card_key(self, engine, card):
+        """
+        :param engine: The game Engine
+        :param card: A card id
+        :return: The key of the card at its current location
+        """
+        pile_index = engine.pile_of[card]
+        slot = card * MAX_PILE_LENGTH + engine.position_of[card]
+
+        if pile_index >= c.TOP_PILE_1:
+            return self.top[card]
+        elif pile_index >= c.MIDDLE_PILE_1:
+            return self.middle[slot * 2 + engine.face_up[card]]
+        elif pile_index == c.BOTTOM_FACE_UP_PILE:
+            return self.waste[slot]
+
+        return self.stock[slot]
+
+    def middle_pile_key(self, engine, pile_index):
+        """
+        :param engine: The game Engine
+        :param pile_index: The index of a middle pile
+        :return: The XOR of the keys of the pile's cards
+        """
+        key = 0
+        for card in engine.piles[pile_index]:
+            key ^= self.card_key(engine, card)
+
+        return key
+
+    def hash_state(self, engine):
+        """
+        :param engine: The game Engine
+        :return: The hash of the whole state
+        """
+        state_hash = 0
+        for pile_index, pile in enumerate(engine.piles):
+            if c.MIDDLE_PILE_1 <= pile_index <= c.MIDDLE_PILE_7:
+                state_hash += self.middle_pile_key(engine, pile_index)
+            else:
+                state_hash += sum(self.card_key(engine, card) for card in pile)
+
+        return state_hash & HASH_MASK
+
+    def moved_cards_key(self, engine, move, cards):
+        """
+        :param engine: The game Engine
+        :param move: A move about to be applied or just undone, or just applied
+        or about to be undone
+        :param cards: The card ids touched by the move
+        :return: The part of the state hash that the move changes: the hashes
+        of its middle piles and the keys of the touched cards in other piles
+        """
+        key = 0
+        for pile_index in {move.source, move.target}:
+            if c.MIDDLE_PILE_1 <= pile_index <= c.MIDDLE_PILE_7:
+                key += self.middle_pile_key(engine, pile_index)
+
+        for card in cards:
+            if not c.MIDDLE_PILE_1 <= engine.pile_of[card] <= c.MIDDLE_PILE_7:
+                key += self.card_key(engine, card)
+
+        return key
+
+
+class TranspositionTable:
+    """
+    Set of visited state hashes holding at most max_entries, evicting the
+    least recently seen hash when full.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.peak_entries = 0
+
+    def visit(self, state_hash):
+        """
+        Record a state.
+        :param state_hash: The state's hash
+        :return: True if the state was already in the table
+        """
+        entries = self.entries
+
+        if state_hash in entries:
+            entries.move_to_end(state_hash)
+            return True
+
+        entries[state_hash] = None
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+        self.peak_entries = max(self.peak_entries, len(entries))
+        return False
+
+
+class Solver:
+    """
+    Decides whether a state can be won. Turning a face down card over and
+    playing a card to a top pile when no other card could ever be placed on it
+    are applied without branching; every other legal move is tried in the
+    greedy policy's priority order.
+    """
+    def __init__(self, max_nodes=1_000_000, time_limit=None, max_table_entries=2_000_000):
+        """
+        :param max_nodes: The number of states to visit before giving up
+        :param time_limit: The number of seconds to search before giving up, or
+        None for no limit
+        :param max_table_entries: The transposition table's capacity
+        """
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.max_table_entries = max_table_entries
+        self.keys = ZobristKeys()
+        self.ranking = GreedyPolicy(None)
+
+    def is_safe_to_top(self, engine, card):
+        """
+        A card can be played to a top pile without losing options when both
+        cards that could be placed on it are already on the top piles.
+        """
+        rank = card_rank(card)
+        if rank <= 1:
+            return True
+
+        for suit in range(len(c.CARD_SUITS)):
+            other = suit * len(c.CARD_VALUES) + rank - 1
+            if is_red(other) != is_red(card) and engine.pile_of[other] < c.TOP_PILE_1:
+                return False
+
+        return True
+
+    def ordered_moves(self, engine):
+        """
+        :param engine: The game Engine
+        :return: The moves to try from the current state, best first
+        """
+        moves = engine.legal_moves()
+
+        for move in moves:
+            if move.source == move.target:
+                return [move]
+
+            if move.target >= c.TOP_PILE_1 \
+                    and self.is_safe_to_top(engine, engine.piles[move.source][-1]):
+                return [move]
+
+        moves.sort(key=lambda move: self.ranking.rank(engine, move))
+        return moves
+
+    def moved_cards(self, engine, move):
+        """
+        :return: The card ids that a move about to be applied will touch
+        """
+        return engine.piles[move.source][-move.count:]
+
+    def solve(self, engine):
+        """
+        Search for a win from the engine's current state. The engine is
+        returned to that state when the search ends.
+        :param engine: The game Engine
+        :return: A SolveResult
+        """
+        start = time.perf_counter()
+        keys = self.keys
+        table = TranspositionTable(self.max_table_entries)
+        state_hash = keys.hash_state(engine)
+        table.visit(state_hash)
+
+        path = []
+        stack = [iter(self.ordered_moves(engine))]
+        nodes = 1
+        status = WON if engine.is_won() else LOST
+
+        while stack and status == LOST:
+            if nodes >= self.max_nodes or (
+                    self.time_limit is not None and nodes % 1024 == 0
+                    and time.perf_counter() - start > self.time_limit):
+                status = UNKNOWN
+                break
+
+            move = next(stack[-1], None)
+
+            if move is None:
+                stack.pop()
+                if path:
+                    state_hash = self.undo(engine, path.pop(), state_hash)
+                continue
+
+            state_hash = self.apply(engine, move, state_hash)
+            nodes += 1
+
+            if table.visit(state_hash):
+                state_hash = self.undo(engine, move, state_hash)
+                continue
+
+            path.append(move)
+
+            if engine.is_won():
+                status = WON
+            else:
+                stack.append(iter(self.ordered_moves(engine)))
+
+        solution = list(path) if status == WON else None
+
+        for move in reversed(path):
+            state_hash = self.undo(engine, move, state_hash)
+
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+
+        return SolveResult(
+            status,
+            solution,
+            nodes,
+            time.perf_counter() - start,
+            table.peak_entries,
+            peak_rss_kb
+        )
+
+    def apply(self, engine, move, state_hash):
+        """
+        Apply a move and update the state hash.
+        :return: The new state hash
+        """
+        cards = self.moved_cards(engine, move)
+        state_hash -= self.keys.moved_cards_key(engine, move, cards)
+        engine.apply(move)
+        return (state_hash + self.keys.moved_cards_key(engine, move, cards)) & HASH_MASK
+
+    def undo(self, engine, move, state_hash):
+        """
+        Revert a move and update the state hash.
+        :return: The new state hash
+        """
+        if move.source == move.target:
+            cards = engine.piles[move.source][-1:]
+        else:
+            cards = engine.piles[move.target][-move.count:]
+
+        state_hash -= self.keys.moved_cards_key(engine, move, cards)
+        engine.undo(move)
+        return (state_hash + self.keys.moved_cards_key(engine, move, cards)) & HASH_MASK
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decide whether numbered deals can be won.')
+    parser.add_argument('--seeds', type=int, nargs=2, default=(0, 10), metavar=('FIRST', 'STOP'),
+                        help='range of deal numbers to solve')
+    parser.add_argument('--max-nodes', type=int, default=1_000_000, help='node budget per deal')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds per deal')
+    parser.add_argument('--max-table-entries', type=int, default=2_000_000,
+                        help='transposition table capacity')
+    args = parser.parse_args()
+
+    solver = Solver(args.max_nodes, args.time_limit, args.max_table_entries)
+
+    for seed in range(*args.seeds):
+        engine = Engine()
+        engine.deal(deal_permutation(seed))
+        result = solver.solve(engine)
+        moves = len(result.moves) if result.moves else '-'
+
+        print(
+            f'seed {seed}: {result.status:<7} moves {moves:>4} nodes {result.nodes:>8} '
+            f'{result.nodes_per_second:>9.0f} nodes/s table {result.peak_table_entries:>8} '
+            f'peak rss {result.peak_rss_kb} kB'
+        )
+
+
+if __name__ == '__main__':
+    main()
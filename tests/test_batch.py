@@ -0,0 +1,49 @@
+"""
+Checks the batch evaluator against benchmarks.state_features, which computes
+the same features one state at a time from the Engine, on the states of random
+playouts.
+"""
+import random
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import batch
+from benchmarks import state_features
+from deals import deal_permutation
+from engine import Engine
+
+
+def playout_states(deal_count=20, steps=200):
+    """
+    :return: The engines' encoded states and their per-state features
+    """
+    states = []
+    expected = []
+
+    for deal_number in range(deal_count):
+        engine = Engine()
+        engine.deal(deal_permutation(deal_number))
+        rng = random.Random(deal_number)
+
+        for _ in range(steps):
+            states.append(batch.encode_engine(engine))
+            expected.append(state_features(engine))
+            moves = engine.legal_moves()
+            if not moves:
+                break
+            engine.apply(rng.choice(moves))
+
+    return np.array(states), expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024])
+def test_features_match_per_state_features(chunk_size):
+    states, expected = playout_states()
+    features = batch.evaluate(states, chunk_size)
+
+    for i, (face_down, foundation, moves, blocked_kings) in enumerate(expected):
+        assert features.face_down[i].tolist() == face_down, i
+        assert features.foundation[i].tolist() == foundation, i
+        assert features.moves[i].tolist() == moves, i
+        assert features.blocked_kings[i] == blocked_kings, i
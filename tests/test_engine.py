@@ -0,0 +1,138 @@
+"""
+Pins the Engine's Klondike rules to the ones Game.play_to_middle and
+Game.play_to_top applied to the card suit and value strings before the engine
+was extracted, and checks that undo reverts every kind of move.
+"""
+import random
+import pytest
+import constants as c
+from deals import deal_permutation
+from engine import Engine, Move, card_id
+
+CARDS = [(suit, value) for suit in c.CARD_SUITS for value in c.CARD_VALUES]
+SOURCE = c.MIDDLE_PILE_1
+COLUMN = c.MIDDLE_PILE_2
+FOUNDATION = c.TOP_PILE_1
+
+
+def baseline_play_to_middle(card, top):
+    """
+    The middle pile rule of the original Game, for a face up card.
+    :param card: The (suit, value) of the played card
+    :param top: The (suit, value) of the pile's top card, or None if it is empty
+    """
+    suit, value = card
+    if value == 'A':
+        return False
+    if top is None:
+        return value == 'K'
+
+    top_suit, top_value = top
+    red_on_black = suit in c.RED_SUITS and top_suit in c.BLACK_SUITS
+    black_on_red = suit in c.BLACK_SUITS and top_suit in c.RED_SUITS
+    order = c.CARD_VALUES.index(top_value) - c.CARD_VALUES.index(value)
+    return (red_on_black or black_on_red) and order == 1
+
+
+def baseline_play_to_top(card, top):
+    """
+    The top pile rule of the original Game, for a single card.
+    :param card: The (suit, value) of the played card
+    :param top: The (suit, value) of the pile's top card, or None if it is empty
+    """
+    suit, value = card
+    if top is None:
+        return value == 'A'
+
+    top_suit, top_value = top
+    order = c.CARD_VALUES.index(top_value) - c.CARD_VALUES.index(value)
+    return order == -1 and top_suit == suit
+
+
+def engine_with(source_cards, target_index, target_cards, face_up=True):
+    """
+    Build a state with source_cards on the first middle pile, target_cards on
+    the target pile and every other card face down in the stock.
+    """
+    piles = [[] for _ in range(c.PILE_COUNT)]
+    piles[SOURCE] = list(source_cards)
+    piles[target_index] = list(target_cards)
+    used = set(source_cards) | set(target_cards)
+    piles[c.BOTTOM_FACE_DOWN_PILE] = [card for card in range(c.CARD_COUNT) if card not in used]
+
+    flags = bytearray(c.CARD_COUNT)
+    for card in target_cards:
+        flags[card] = 1
+    for card in source_cards:
+        flags[card] = face_up
+
+    engine = Engine(debug=True)
+    engine.set_state(piles, flags)
+    return engine
+
+
+@pytest.mark.parametrize('target_index, rule', [
+    (COLUMN, baseline_play_to_middle),
+    (FOUNDATION, baseline_play_to_top),
+])
+def test_single_card_rules_match_baseline(target_index, rule):
+    for card in CARDS:
+        move = Move(SOURCE, target_index, 1, False)
+        assert engine_with([card_id(*card)], target_index, []).is_legal(move) == rule(card, None), card
+
+        for top in CARDS:
+            if top == card:
+                continue
+            engine = engine_with([card_id(*card)], target_index, [card_id(*top)])
+            assert engine.is_legal(move) == rule(card, top), (card, top)
+
+
+def test_face_down_cards_cannot_be_played():
+    engine = engine_with([card_id('Spades', 'K')], COLUMN, [], face_up=False)
+    assert not engine.is_legal(Move(SOURCE, COLUMN, 1, False))
+    assert engine.is_legal(Move(SOURCE, SOURCE, 1, True))
+
+
+def test_only_single_cards_go_to_top_piles():
+    engine = engine_with([card_id('Hearts', 'A'), card_id('Spades', '2')], FOUNDATION, [])
+    assert not engine.is_legal(Move(SOURCE, FOUNDATION, 2, False))
+
+    engine = engine_with([card_id('Spades', '3'), card_id('Hearts', '2')], FOUNDATION, [card_id('Hearts', 'A')])
+    assert engine.is_legal(Move(SOURCE, FOUNDATION, 1, False))
+    assert not engine.is_legal(Move(SOURCE, FOUNDATION, 2, False))
+
+
+def test_stacks_move_by_their_bottom_card():
+    stack = [card_id('Spades', '8'), card_id('Hearts', '7'), card_id('Clubs', '6')]
+    target = [card_id('Diamonds', '9')]
+    engine = engine_with(stack, COLUMN, target)
+
+    assert engine.is_legal(Move(SOURCE, COLUMN, 3, False))
+    assert not engine.is_legal(Move(SOURCE, COLUMN, 2, False))
+
+
+def snapshot(engine):
+    return [list(pile) for pile in engine.piles], bytes(engine.face_up)
+
+
+@pytest.mark.parametrize('deal_number', range(10))
+def test_apply_undo_round_trip(deal_number):
+    engine = Engine(debug=True)
+    engine.deal(deal_permutation(deal_number))
+    rng = random.Random(deal_number)
+
+    for _ in range(300):
+        moves = engine.legal_moves()
+        if not moves:
+            break
+
+        move = rng.choice(moves)
+        before = snapshot(engine)
+        engine.apply(move)
+        after = snapshot(engine)
+
+        engine.undo(move)
+        assert snapshot(engine) == before, move
+
+        engine.apply(move)
+        assert snapshot(engine) == after, move
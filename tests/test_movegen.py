@@ -0,0 +1,34 @@
+"""
+Checks the incremental MoveGenerator against a full Engine.legal_moves scan
+along random playouts of every variant, undoing moves as well as applying
+them.
+"""
+import random
+import pytest
+from deals import deal_permutation
+from engine import Engine
+from movegen import MoveGenerator
+from variants import VARIANTS
+
+
+@pytest.mark.parametrize('deal_number', range(10))
+@pytest.mark.parametrize('variant', VARIANTS.values(), ids=VARIANTS.keys())
+def test_moves_match_full_scan(variant, deal_number):
+    engine = Engine(debug=True, variant=variant)
+    engine.deal(deal_permutation(deal_number, variant.card_count))
+    generator = MoveGenerator(engine)
+    rng = random.Random(deal_number)
+    history = []
+
+    for _ in range(300):
+        moves = engine.legal_moves()
+        assert sorted(generator.legal_moves()) == sorted(moves)
+
+        if history and rng.random() < 0.2:
+            generator.undo(history.pop())
+        elif moves:
+            move = rng.choice(moves)
+            generator.apply(move)
+            history.append(move)
+        else:
+            break
@@ -0,0 +1,151 @@
+from concurrent.futures import ThreadPoolExecutor
+import arcade
+import constants as c
+
+
+def face_image_file_name(suit, value):
+    """
+    Get the resource file name of a card's face image.
+    :param suit: The card suit, one of CARD_SUITS
+    :param value: The card value, one of CARD_VALUES
+    :return: The resource file name
+    """
+    return f'{c.CARD_IMAGE_PATH}{suit}{value}.png'
+
+
+def card_image_file_names():
+    """
+    :return: The resource file names of the back image and all 52 card faces
+    """
+    return [c.FACE_DOWN_IMAGE] + [
+        face_image_file_name(suit, value)
+        for suit in c.CARD_SUITS
+        for value in c.CARD_VALUES
+    ]
+
+
+class TextureRegistry:
+    """
+    Shared cache of card textures keyed by resource file name, so that turning
+    a card over only swaps the sprite's texture for one that is already loaded.
+    The hits and misses counters record how many lookups were served from the
+    cache and how many had to go through arcade.load_texture. Images decoded
+    in the background by preload_async are held as futures in pending until
+    collect or a lookup moves them into the cache.
+    """
+    def __init__(self):
+        self.textures = {}
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, file_name):
+        """
+        Load a texture into the cache without touching the counters, waiting
+        for it if it is being decoded in the background.
+        :param file_name: The resource file name of the image
+        :return: The loaded texture
+        """
+        future = self.pending.pop(file_name, None)
+
+        if future is not None:
+            texture = future.result()
+        else:
+            texture = arcade.load_texture(file_name, hit_box_algorithm='None')
+
+        self.textures[file_name] = texture
+        return texture
+
+    def get(self, file_name):
+        """
+        Look up a texture, loading it on a cache miss.
+        :param file_name: The resource file name of the image
+        :return: The texture
+        """
+        texture = self.textures.get(file_name)
+
+        if texture is None:
+            self.misses += 1
+            texture = self.load(file_name)
+        else:
+            self.hits += 1
+
+        return texture
+
+    def find(self, file_name):
+        """
+        Look up a texture without loading or waiting for it.
+        :param file_name: The resource file name of the image
+        :return: The texture, or None if it is not loaded yet
+        """
+        texture = self.textures.get(file_name)
+
+        if texture is not None:
+            self.hits += 1
+
+        return texture
+
+    def preload_async(self, max_workers=c.TEXTURE_LOADER_THREADS):
+        """
+        Start decoding the back image and all 52 card faces on a thread pool.
+        collect then makes them available from the main thread as they finish.
+        :param max_workers: The number of decoding threads
+        """
+        file_names = [
+            file_name for file_name in card_image_file_names()
+            if file_name not in self.textures and file_name not in self.pending
+        ]
+
+        if not file_names:
+            return
+
+        executor = ThreadPoolExecutor(max_workers, thread_name_prefix='textures')
+
+        for file_name in file_names:
+            self.pending[file_name] = executor.submit(
+                arcade.load_texture, file_name, hit_box_algorithm='None'
+            )
+
+        executor.shutdown(wait=False)
+
+    def collect(self, atlas=None, limit=None, first=()):
+        """
+        Move textures that have finished decoding into the cache and add them
+        to the given texture atlas. Must be called from the thread that owns
+        the atlas's OpenGL context.
+        :param atlas: The arcade TextureAtlas used by the card sprite lists, or
+        None to only cache the textures
+        :param limit: The maximum number of textures to collect, to spread the
+        atlas uploads over several frames, or None for no limit
+        :param first: File names to collect before any others; repeated names
+        are collected once
+        :return: The file names of the textures collected
+        """
+        pending = self.pending
+        done = [
+            file_name for file_name in dict.fromkeys(first)
+            if file_name in pending and pending[file_name].done()
+        ]
+        done += [
+            file_name for file_name, future in pending.items()
+            if future.done() and file_name not in done
+        ]
+        collected = done[:limit]
+
+        for file_name in collected:
+            texture = self.load(file_name)
+
+            if atlas is not None:
+                atlas.add(texture)
+
+        return collected
+
+    def reset_counters(self):
+        """
+        Set the hits and misses counters back to zero.
+        """
+        self.hits = 0
+        self.misses = 0
+
+
+registry = TextureRegistry()
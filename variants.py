@@ -0,0 +1,124 @@
+"""
+Rule variants. A Variant describes the deck, the piles and the rules of a
+game, and holds the lookup tables the Engine uses to apply them. Piles are
+always numbered the same way: the stock, the waste, the columns (the middle
+piles) left to right, then the foundations (the top piles).
+
+Card ids run over every deck: deck index * CARD_COUNT + suit index * 13 +
+value index.
+"""
+import constants as c
+
+SUIT_COUNT = len(c.CARD_SUITS)
+RANK_COUNT = len(c.CARD_VALUES)
+RUN_LENGTH = RANK_COUNT
+
+
+class Variant:
+    """
+    The layout and rules of one kind of game.
+
+    Klondike variants build down in alternating colors on the columns, only
+    put Kings on empty columns, build foundations up by suit one card at a
+    time from the Ace, and draw draw_count cards from the stock to the waste.
+
+    Spider variants build down regardless of suit, put any card on an empty
+    column, only pick up runs of one suit, only move a whole King-to-Ace run
+    of one suit to an empty foundation, and deal one card from the stock onto
+    every column when none of them is empty. They have no waste.
+    """
+    def __init__(self, name, title, decks, column_sizes, foundations, draw_count=0, spider=False):
+        """
+        :param name: The variant's short name, used on the command line
+        :param title: The variant's name as shown to the player
+        :param decks: The number of full decks shuffled together
+        :param column_sizes: The number of cards dealt to each column
+        :param foundations: The number of foundations
+        :param draw_count: The number of cards drawn from the stock at a time
+        (Klondike only)
+        :param spider: True for Spider rules, False for Klondike rules
+        """
+        self.name = name
+        self.title = title
+        self.decks = decks
+        self.column_sizes = tuple(column_sizes)
+        self.columns = len(self.column_sizes)
+        self.foundations = foundations
+        self.draw_count = draw_count
+        self.spider = spider
+
+        self.card_count = c.CARD_COUNT * decks
+        self.first_column = c.MIDDLE_PILE_1
+        self.first_foundation = self.first_column + self.columns
+        self.pile_count = self.first_foundation + foundations
+        self.screen_width = max(
+            c.SCREEN_WIDTH,
+            int(2 * c.START_X + (max(self.columns, foundations) - 1) * c.X_SPACING)
+        )
+
+        cards = range(self.card_count)
+        self.ranks = bytes(card % RANK_COUNT for card in cards)
+        self.suits = bytes(card // RANK_COUNT % SUIT_COUNT for card in cards)
+        self.colors = bytes(c.CARD_COLORS[card % c.CARD_COUNT] for card in cards)
+        self.kings = tuple(card for card in cards if self.ranks[card] == c.KING_RANK)
+        self.aces = tuple(card for card in cards if self.ranks[card] == c.ACE_RANK)
+
+        # stack_on[card * card_count + other] is 1 if card can be placed on
+        # other in a column
+        self.stack_on = bytes(
+            self.ranks[other] - self.ranks[card] == 1
+            and (spider or self.ranks[card] != c.ACE_RANK and self.colors[card] != self.colors[other])
+            for card in cards
+            for other in cards
+        )
+        # foundation_parent[card * card_count + other] is 1 if card builds on
+        # other in a foundation (never in Spider, which only moves whole runs
+        # to empty foundations)
+        self.foundation_parent = bytes(
+            not spider
+            and self.suits[card] == self.suits[other]
+            and self.ranks[card] - self.ranks[other] == 1
+            for card in cards
+            for other in cards
+        )
+        # stackable_on[card] holds the cards that can be placed on card in a
+        # column, and foundation_children[card] the cards that build on it in
+        # a foundation
+        self.stackable_on = [
+            tuple(other for other in cards if self.stack_on[other * self.card_count + card])
+            for card in cards
+        ]
+        self.foundation_children = [
+            tuple(
+                other for other in cards
+                if self.foundation_parent[other * self.card_count + card]
+            )
+            for card in cards
+        ]
+
+    def is_column(self, pile_index):
+        """
+        Check whether a pile is one of the columns, whose cards are fanned out.
+        :param pile_index: The index of the pile
+        :return: True if the pile is a column
+        """
+        return self.first_column <= pile_index < self.first_foundation
+
+    def __repr__(self):
+        return f'Variant({self.name!r})'
+
+
+KLONDIKE = Variant(
+    'klondike', 'Klondike', 1, range(1, c.MIDDLE_ROW_LEN + 1), c.TOP_ROW_LEN, c.CARDS_TO_SKIP
+)
+KLONDIKE_DRAW_1 = Variant(
+    'klondike-draw-1', 'Klondike (draw 1)', 1, range(1, c.MIDDLE_ROW_LEN + 1), c.TOP_ROW_LEN, 1
+)
+DOUBLE_KLONDIKE = Variant(
+    'double-klondike', 'Double Klondike', 2, range(1, 10), 2 * c.TOP_ROW_LEN, c.CARDS_TO_SKIP
+)
+SPIDER = Variant(
+    'spider', 'Spider', 2, [6] * 4 + [5] * 6, 2 * c.TOP_ROW_LEN, spider=True
+)
+
+VARIANTS = {variant.name: variant for variant in (KLONDIKE, KLONDIKE_DRAW_1, DOUBLE_KLONDIKE, SPIDER)}